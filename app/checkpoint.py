@@ -0,0 +1,77 @@
+import os
+import threading
+
+import serialization
+from tx_parser import Trade
+
+
+class CheckpointLog:
+    # Append-only JSONL log of a wallet's processed signatures, replayed when an interrupted run restarts
+    def __init__(self, path):
+        self.path = path
+        # signature -> (trades, minted tokens)
+        self.processed = {}
+        # signature -> last error, cleared once the signature is processed
+        self.failed = {}
+        self._lock = threading.Lock()
+        self._file = None
+        self._needs_newline = False
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, 'rb') as f:
+            content = f.read()
+        # A crash mid-write leaves a partial last line, the next append has to start on a new one
+        self._needs_newline = bool(content) and not content.endswith(b"\n")
+
+        for line in content.splitlines():
+            try:
+                record = serialization.loads(line)
+            except ValueError:
+                continue
+            if record["type"] == "processed":
+                trades = [Trade(*trade) for trade in record["trades"]]
+                self.processed[record["signature"]] = (trades, record.get("minted", []))
+                self.failed.pop(record["signature"], None)
+            elif record["type"] == "failed":
+                self.failed[record["signature"]] = record["error"]
+
+    def _append(self, records):
+        if not records:
+            return
+        with self._lock:
+            if self._file is None:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                self._file = open(self.path, 'ab')
+                if self._needs_newline:
+                    self._file.write(b"\n")
+            self._file.write(b"".join(serialization.dumps(record) + b"\n" for record in records))
+            self._file.flush()
+
+    def record_processed(self, results):
+        # results maps a signature to its (trades, minted tokens), transactions without trades are recorded too
+        records = []
+        for signature, (trades, minted) in results.items():
+            record = {"type": "processed", "signature": signature, "trades": [list(trade) for trade in trades]}
+            if minted:
+                record["minted"] = list(minted)
+            records.append(record)
+        self._append(records)
+
+    def record_failed(self, signatures, error):
+        self._append([{"type": "failed", "signature": signature, "error": error} for signature in signatures])
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def discard(self):
+        # Called once the wallet's processed transactions are safely saved
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -0,0 +1,186 @@
+import argparse
+import cProfile
+import functools
+import os
+import sys
+from datetime import datetime
+
+import config
+import jobs
+
+# pandas, tqdm and the API clients are imported inside the commands that need them,
+# so --help, argument errors and `jobs` start instantly
+
+
+def add_settings_arguments(parser):
+    parser.add_argument("--config", help="Path to a JSON settings file, defaults to config/walko.json")
+    parser.add_argument("--rpc-url", help="Solana RPC endpoint to use")
+    parser.add_argument("--set", action="append", default=[], metavar="KEY=VALUE",
+                        help="Override any setting, can be repeated")
+    parser.add_argument("--profile", action="store_true",
+                        help="Run under cProfile and save the stats, wallet workers are not profiled")
+    parser.add_argument("--quiet", action="store_true", help="No progress output, same as --set progress=none")
+
+
+def load_cli_settings(parser, args):
+    # Malformed --set values are usage errors, parser.error reports them and exits with status 2
+    overrides = {}
+    for item in args.set:
+        key, separator, value = item.partition("=")
+        if not separator or not key:
+            parser.error(f"--set expects KEY=VALUE, got '{item}'")
+        try:
+            overrides.update(config.convert({key: value}))
+        except ValueError as e:
+            parser.error(f"--set {item}: {e}")
+    overrides["rpc_url"] = args.rpc_url
+    if args.quiet:
+        overrides["progress"] = "none"
+    return config.load_settings(args.config, overrides)
+
+
+def read_wallet_file(path):
+    # One address per line, blank lines and # comments are ignored
+    wallets = {}
+    with open(path) as f:
+        for line in f:
+            address = line.split("#", 1)[0].strip()
+            if address:
+                wallets[address] = None
+    return list(wallets)
+
+
+def jobs_path(settings):
+    return os.path.join(settings.data_dir, 'jobs')
+
+
+def run_journal(journal, settings, save_type, leaderboard_name, incremental=False):
+    import main
+    import runner
+
+    pending = journal.pending()
+    if len(pending) < len(journal.wallets):
+        print(f"Resuming job {journal.id}: {len(pending)} of {len(journal.wallets)} wallets left")
+
+    analyse = main.calculate_wallet_performance
+    if incremental:
+        analyse = functools.partial(main.calculate_wallet_performance, incremental=True)
+    if pending:
+        runner.run_wallets(pending, analyse, save_type, on_result=journal.record)
+
+    leaderboard_path = os.path.join(settings.data_dir, save_type, datetime.now().strftime('%Y-%m-%d'), 'results')
+    runner.save_leaderboard(journal.summaries(), leaderboard_path, leaderboard_name)
+
+    failed = journal.counts()[jobs.FAILED]
+    if failed:
+        print(f"{failed} wallets failed, run the same command again to retry them")
+        return 1
+    return 0
+
+
+def command_wallet(args, settings):
+    import main
+
+    save_type = "watched" if args.incremental else "single"
+    try:
+        main.calculate_wallet_performance(args.address, save_type, incremental=args.incremental)
+    except Exception as e:
+        print(f"{args.address} failed: {e}, run the same command again to retry it")
+        return 1
+    return 0
+
+
+def command_token_top(args, settings):
+    journal = jobs.JobJournal.open(jobs_path(settings), jobs.job_id("token-top", args.token), "token-top",
+                                   args.token, fresh=args.fresh)
+    # Holders are screened once per job, a resumed job keeps its original wallet list
+    if not journal.wallets:
+        import main
+        wallets, err = main.get_top_performers(args.token)
+        if err is not None:
+            print(err)
+            return 1
+        journal.add_wallets(wallets)
+
+    return run_journal(journal, settings, "multi", f"leaderboard_{args.token}")
+
+
+def command_batch(args, settings):
+    wallets = read_wallet_file(args.file)
+    save_type = "watched" if args.incremental else "batch"
+    target = os.path.abspath(args.file)
+    journal = jobs.JobJournal.open(jobs_path(settings), jobs.job_id(f"batch-{save_type}", target), "batch",
+                                   target, fresh=args.fresh)
+    # Wallets added to the file since the job started are picked up as well
+    journal.add_wallets(wallets)
+
+    name = os.path.splitext(os.path.basename(args.file))[0]
+    return run_journal(journal, settings, save_type, f"leaderboard_{name}", incremental=args.incremental)
+
+
+def command_jobs(args, settings):
+    for journal in jobs.JobJournal.load_all(jobs_path(settings)):
+        counts = ", ".join(f"{count} {status}" for status, count in journal.counts().items())
+        print(f"{journal.id}  {journal.data['target']}  ({counts})")
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Walko, a blockchain wallet analyzer (non-interactive)")
+    add_settings_arguments(parser)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    wallet = subparsers.add_parser("wallet", help="Analyse a single wallet")
+    wallet.add_argument("address")
+    wallet.add_argument("--incremental", action="store_true", help="Sync only new transactions of a watched wallet")
+    wallet.set_defaults(handler=command_wallet)
+
+    token_top = subparsers.add_parser("token-top", help="Rank the top holders of a token")
+    token_top.add_argument("token")
+    token_top.add_argument("--fresh", action="store_true", help="Ignore the unfinished journal and start over")
+    token_top.set_defaults(handler=command_token_top)
+
+    batch = subparsers.add_parser("batch", help="Analyse every wallet listed in a file, one address per line")
+    batch.add_argument("file")
+    batch.add_argument("--incremental", action="store_true", help="Treat the file as a watch list and sync it")
+    batch.add_argument("--fresh", action="store_true", help="Ignore the unfinished journal and start over")
+    batch.set_defaults(handler=command_batch)
+
+    job_list = subparsers.add_parser("jobs", help="List job journals and their progress")
+    job_list.set_defaults(handler=command_jobs, lightweight=True)
+
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    settings = load_cli_settings(parser, args)
+    if getattr(args, "lightweight", False):
+        return args.handler(args, settings)
+
+    import core
+    import logging_config
+    logging_config.setup_logging(settings.log_level)
+    core.configure(settings)
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler is not None:
+        profiler.enable()
+    try:
+        status = args.handler(args, settings)
+    except KeyboardInterrupt:
+        # Wallets that did not finish stay pending in the job journal
+        print("Interrupted, run the same command again to resume")
+        return 130
+    finally:
+        if profiler is not None:
+            profiler.disable()
+
+    import main as interactive
+    interactive.report_run(profiler)
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
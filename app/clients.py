@@ -0,0 +1,97 @@
+import time
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import brotli  # noqa: F401 - enables br decoding in urllib3 and aiohttp
+    ACCEPT_ENCODING = "gzip, deflate, br"
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+import metrics
+import serialization
+
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 30
+KEEPALIVE_TIMEOUT = 30
+# Transport retries cover dropped connections and 5xx, 429 is left to the rate limiter
+TRANSPORT_RETRIES = 3
+RETRY_STATUSES = (500, 502, 503, 504)
+
+
+class ApiClient:
+    def __init__(self, endpoint, base_url, limiter, pool_size, headers=None):
+        self.endpoint = endpoint
+        self.base_url = base_url
+        self.limiter = limiter
+        self.pool_size = pool_size
+        self.headers = {"Accept-Encoding": ACCEPT_ENCODING, **(headers or {})}
+        self.session = self._create_session()
+
+    def _create_session(self):
+        retry = Retry(
+            total=TRANSPORT_RETRIES,
+            backoff_factor=0.5,
+            status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET", "POST"}),
+            respect_retry_after_header=False,
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def url(self, path):
+        if path.startswith("http://") or path.startswith("https://"):
+            return path
+        return self.base_url.rstrip("/") + "/" + path.lstrip("/")
+
+    def request(self, method, path, max_retries=3, **kwargs):
+        kwargs.setdefault("timeout", (CONNECT_TIMEOUT, READ_TIMEOUT))
+        for attempt in range(max_retries):
+            self.limiter.acquire(self.endpoint)
+            response = self.send(method, path, **kwargs)
+            if response.status_code != 429:
+                # Errors say nothing about the budget, only a successful call lets the rate recover
+                if 200 <= response.status_code < 300:
+                    self.limiter.record_success(self.endpoint)
+                return response
+            # Back off before the next slot is handed out, honouring Retry-After when present
+            self.limiter.record_throttle(self.endpoint, response.headers.get("Retry-After"), attempt)
+        return response
+
+    def send(self, method, path, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, self.url(path), **kwargs)
+        except requests.exceptions.RequestException:
+            metrics.record_request(self.endpoint, time.perf_counter() - start, "error")
+            raise
+        metrics.record_request(self.endpoint, time.perf_counter() - start, response.status_code,
+                               len(response.request.body or b""), len(response.content))
+        return response
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def close(self):
+        self.session.close()
+
+
+class RpcClient(ApiClient):
+    def __init__(self, base_url, limiter, pool_size):
+        super().__init__("rpc", base_url, limiter, pool_size, headers={"Content-Type": "application/json"})
+
+    def post(self, payload, max_retries=3):
+        return self.request("POST", self.base_url, max_retries=max_retries, data=serialization.dumps(payload))
+
+    def create_async_session(self):
+        connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=KEEPALIVE_TIMEOUT)
+        timeout = aiohttp.ClientTimeout(sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout, headers=self.headers)
@@ -0,0 +1,110 @@
+import dataclasses
+import json
+import os
+
+config_dir = os.path.join(os.path.dirname(__file__), '..', 'config')
+default_config_path = os.path.join(config_dir, 'walko.json')
+birdeye_config_path = os.path.join(config_dir, 'birdeye.json')
+
+ENV_PREFIX = "WALKO_"
+
+
+@dataclasses.dataclass
+class Settings:
+    rpc_url: str = "https://docs-demo.solana-mainnet.quiknode.pro/"
+    birdeye_url: str = "https://public-api.birdeye.so"
+    dexscreener_url: str = "https://api.dexscreener.com"
+    birdeye_api_key: str = ""
+
+    # Rate limits per endpoint, as calls per period in seconds
+    rpc_calls: int = 10
+    rpc_period: float = 10
+    birdeye_calls: int = 10
+    birdeye_period: float = 10
+    dexscreener_calls: int = 300
+    dexscreener_period: float = 60
+
+    # Root for caches, processed transactions, results and diagnostics
+    data_dir: str = os.path.join(os.path.dirname(__file__), '..', 'data')
+
+    max_concurrent_connections: int = 5
+    transaction_batch_size: int = 50
+    # Upper bound on signatures crawled ahead of the transaction fetchers
+    max_pending_signatures: int = 5000
+    wallet_workers: int = 4
+    # "fifo" or "average"
+    cost_basis_method: str = "fifo"
+    # Wallet pre-filter: fewer valid signatures than this is a one-time trader, more per day is a bot
+    prefilter_min_signatures: int = 3
+    prefilter_max_daily_transactions: float = 500
+    # Recent signatures sampled per owner to judge its activity
+    prefilter_sample_size: int = 100
+    # Top performers analyse the largest holders found by a full holder scan
+    holder_limit: int = 100
+    # Always scan holders in 256 calls split by owner address, otherwise only when a single call fails or is too large
+    holder_scan_sharded: bool = False
+    # Result and processed files are written compact unless this is set
+    pretty_json: bool = False
+    # Adds every trade, grouped by token, to the saved results, off by default as it dominates the PnL step
+    result_transactions: bool = False
+    # Trades and wallet summaries are appended to data_dir/export as "ndjson", "parquet" (needs pyarrow) or "none"
+    export_format: str = "ndjson"
+    # Log records are written to ./logs as JSON lines by a background thread
+    log_level: str = "INFO"
+    # "auto" (bars on a terminal, periodic log records otherwise), "bar", "log" or "none"
+    progress: str = "auto"
+    # Minimum seconds between progress refreshes
+    progress_interval: float = 1.0
+
+    def rate_limits(self):
+        return {
+            "rpc": (self.rpc_calls, self.rpc_period),
+            "birdeye": (self.birdeye_calls, self.birdeye_period),
+            "dexscreener": (self.dexscreener_calls, self.dexscreener_period),
+        }
+
+
+def read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def convert(values):
+    types = {field.name: field.type for field in dataclasses.fields(Settings)}
+    converted = {}
+    for key, value in values.items():
+        if key not in types:
+            raise ValueError(f"Unknown setting: {key}")
+        converted[key] = to_bool(value) if types[key] is bool else types[key](value)
+    return converted
+
+
+def to_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ("1", "true", "yes", "on")
+    return bool(value)
+
+
+def load_settings(path=None, overrides=None):
+    # Precedence: defaults < config files < WALKO_* environment variables < overrides (CLI flags)
+    values = {}
+
+    if os.path.exists(birdeye_config_path):
+        api_key = read_json(birdeye_config_path).get('api_key')
+        if api_key:
+            values["birdeye_api_key"] = api_key
+
+    if path is not None:
+        values.update(read_json(path))
+    elif os.path.exists(default_config_path):
+        values.update(read_json(default_config_path))
+
+    for field in dataclasses.fields(Settings):
+        env_value = os.environ.get(ENV_PREFIX + field.name.upper())
+        if env_value is not None:
+            values[field.name] = env_value
+
+    if overrides:
+        values.update({key: value for key, value in overrides.items() if value is not None})
+
+    return Settings(**convert(values))
@@ -1,48 +1,83 @@
-import datetime
-import inspect
-import json
+import logging
 import os
 import time
 
 import requests
-from ratelimit import sleep_and_retry, limits
-from tqdm import tqdm
 
-public_api_url = "https://docs-demo.solana-mainnet.quiknode.pro/"
-headers = {
-    "Content-Type": "application/json"
-}
+from price_cache import PriceCache, MISS
+from price_history import PriceHistory, PriceSeries, plan_price_ranges
+import ledger
+import metrics
+import positions
+import progress
+import serialization
+from clients import ApiClient, RpcClient
+from config import load_settings
+from rate_limiter import FileBackend, RateLimiter
+from tx_store import TransactionStore
 
-# Rate limit constants
-MAX_REQUESTS_PER_RPC = 10
-MAX_CONCURRENT_CONNECTIONS = 5
-CONNECTION_RATE_LIMIT = 10
+SIGNATURE_PAGE_SIZE = 1000
 
+# Missing prices younger than this are not cached, Birdeye may still be indexing them
+MISSING_PRICE_GRACE_PERIOD = 3600
 
-@sleep_and_retry
-@limits(calls=MAX_REQUESTS_PER_RPC, period=CONNECTION_RATE_LIMIT)
-def check_limit():
-    return
+# Number of 1m candles requested per Birdeye history_price range call
+PRICE_HISTORY_PAGE_SIZE = 1000
+
+# Addresses accepted per Birdeye multi_price and DexScreener tokens call
+BIRDEYE_MULTI_PRICE_LIMIT = 100
+DEXSCREENER_TOKENS_LIMIT = 30
+
+# Spot snapshots older than this are dropped when a new one starts
+SPOT_SNAPSHOT_RETENTION = 86400
+
+_price_cache = None
+_transaction_store = None
+_spot_snapshot = None
+price_history = PriceHistory()
+
+logger = logging.getLogger(__name__)
+
+settings = None
+rate_limiter = None
+rpc_client = None
+birdeye_client = None
+dexscreener_client = None
+
+
+def configure(new_settings):
+    global settings, rate_limiter, rpc_client, birdeye_client, dexscreener_client, _price_cache, _transaction_store
+    settings = new_settings
+    pool_size = settings.max_concurrent_connections
+    # Caches are reopened under the configured data directory on first use
+    _price_cache = None
+    _transaction_store = None
+
+    rate_limit_backend = FileBackend(os.path.join(settings.data_dir, 'cache', 'ratelimit'))
+    rate_limiter = RateLimiter(settings.rate_limits(), rate_limit_backend)
+    rpc_client = RpcClient(settings.rpc_url, rate_limiter, pool_size)
+    birdeye_client = ApiClient("birdeye", settings.birdeye_url, rate_limiter, pool_size,
+                               headers={"X-API-KEY": settings.birdeye_api_key})
+    dexscreener_client = ApiClient("dexscreener", settings.dexscreener_url, rate_limiter, pool_size)
+    progress.configure(settings.progress, settings.progress_interval)
 
 
 def fetch_data(address):
-    url = f"https://api.dexscreener.com/latest/dex/search/?q={address}"
     try:
-        response = requests.get(url)
+        response = dexscreener_client.get("/latest/dex/search/", params={"q": address})
         if response.status_code == 200:
-            data = response.json()
+            data = serialization.loads(response.content)
             if 'pairs' in data and isinstance(data['pairs'], list) and len(data['pairs']) > 0:
                 return data['pairs'][0], None  # Return the first entry and no error
             else:
                 return None, "No pairs found in the response"
         else:
             return None, f"Error: {response.status_code} - {response.reason}"
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, ValueError) as e:
         return None, f"Request error: {e}"
 
 
 def get_interacting_wallets_sol(token_address):
-    check_limit()
     payload = {
         "jsonrpc": "2.0",
         "id": 1,
@@ -52,333 +87,327 @@ def get_interacting_wallets_sol(token_address):
 
     try:
 
-        response = requests.post(public_api_url, headers=headers, data=json.dumps(payload))
+        response = rpc_client.post(payload)
 
         if response.status_code == 200:
-            data = response.json()
+            data = serialization.loads(response.content)
             return data["result"]["value"], None
 
         else:
             return None, f"Error: {response.status_code} - {response.reason}"
-    except requests.exceptions.RequestException as e:
+    except (requests.exceptions.RequestException, ValueError) as e:
         return None, f"Request error: {e}"
 
 
-def get_transaction_signatures(address):
-
-    current_function_name = inspect.currentframe().f_code.co_name
-    all_signatures = []
-    before = None
-
-    try:
-        while True:
-            check_limit()
-            payload = {
-                "jsonrpc": "2.0",
-                "id": 1,
-                "method": "getSignaturesForAddress",
-                "params": [
-                    address,
-                    {"limit": 1000, "before": before} if before else {"limit": 1000}
-                ]
-            }
-
-            response = requests.post(public_api_url, headers=headers, data=json.dumps(payload))
-            response.raise_for_status()
-
-            if response.status_code == 200:
-                data = response.json()
-                if "error" in data:
-                    return None, f"Error for function {current_function_name}: {data['error']}"
-
-                filtered_results = [tx for tx in data["result"] if
-                                    tx["err"] is None and tx["confirmationStatus"] == "finalized"]
-                all_signatures.extend(filtered_results)
-
-                if len(data["result"]) < 1000:
-                    break
-                print(data["result"][-1]["signature"])
-                before = data["result"][-1]["signature"]
-            else:
-                return None, f"Error for function {current_function_name}: {response.status_code} - {response.reason}"
-
-        return all_signatures, None
+def build_signatures_payload(address, before=None, until=None, limit=SIGNATURE_PAGE_SIZE):
+    options = {"limit": limit}
+    if before:
+        options["before"] = before
+    if until:
+        # Stop paging once the newest already processed signature is reached
+        options["until"] = until
+    return {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "getSignaturesForAddress",
+        "params": [address, options]
+    }
 
-    except requests.exceptions.RequestException as e:
-        return None, f"Request error for function {current_function_name}: {e}"
 
+def filter_signatures(page):
+    return [tx for tx in page if tx["err"] is None and tx["confirmationStatus"] == "finalized"]
 
-def get_transaction_details(signature):
 
-    payload = {
+def build_transaction_payload(signature, request_id=1):
+    return {
         "jsonrpc": "2.0",
-        "id": 1,
+        "id": request_id,
         "method": "getTransaction",
         "params": [
             signature,
             {"encoding": "jsonParsed", "maxSupportedTransactionVersion": 0}
         ]
     }
-    current_function_name = inspect.currentframe().f_code.co_name
-    max_retries = 3
-
-    for attempt in range(max_retries):
-        check_limit()
-        try:
-            response = requests.post(public_api_url, headers=headers, data=json.dumps(payload))
-
-            if response.status_code == 200:
-                data = response.json()
-                return data.get("result"), None
-            elif response.status_code == 429:
-                if attempt < max_retries - 1:
-                    check_limit()
-                else:
-                    return None, f"Error for function {current_function_name}: {response.status_code} - {response.reason} after {max_retries} attempts"
-            else:
-                return None, f"Error for function {current_function_name}: {response.status_code} - {response.reason}"
-        except requests.exceptions.RequestException as e:
-            return None, f"Request error for function {current_function_name}: {e}"
 
 
-def get_token_price(token_address, timestamp):
-    check_limit()
+def build_transaction_batch_payload(signatures):
+    # Request ids are the position of the signature in the batch
+    return [build_transaction_payload(signature, request_id=index) for index, signature in enumerate(signatures)]
 
-    if token_address == "":
-        return None
 
-    dt_object = datetime.datetime.fromtimestamp(timestamp)
-    date_string = dt_object.strftime('%d-%m-%Y')
+def map_batch_responses(signatures, data):
+    results = {}
+    failed = []
 
-    time_from = timestamp - 30  # 30 sec before
-    time_to = timestamp + 30  # 30 sec after
+    if not isinstance(data, list):
+        return results, list(signatures)
 
-    json_file_path = os.path.join(os.path.dirname(__file__), '..', 'config', 'birdeye.json')
-    with open(json_file_path) as f:
-        config = json.load(f)
-    api_key = config.get('api_key')
+    responses_by_id = {entry.get("id"): entry for entry in data if isinstance(entry, dict)}
+    for index, signature in enumerate(signatures):
+        entry = responses_by_id.get(index)
+        if entry is None or "error" in entry:
+            failed.append(signature)
+        else:
+            results[signature] = entry.get("result")
 
-    url = f"https://public-api.birdeye.so/defi/history_price?address=" \
-          f"{token_address}&address_type=token&type=1m&time_from=" \
-          f"{time_from}&time_to={time_to}"
+    return results, failed
 
-    api_headers = {"X-API-KEY": api_key}
 
+def get_price_cache():
+    global _price_cache
+    if _price_cache is None:
+        _price_cache = PriceCache(os.path.join(settings.data_dir, 'cache', 'prices.sqlite'))
+    return _price_cache
+
+
+def get_transaction_store():
+    global _transaction_store
+    if _transaction_store is None:
+        _transaction_store = TransactionStore(os.path.join(settings.data_dir, 'cache', 'transactions.sqlite'))
+    return _transaction_store
+
+
+def fetch_price_history(token_address, time_from, time_to):
+    params = {
+        "address": token_address,
+        "address_type": "token",
+        "type": "1m",
+        "time_from": time_from,
+        "time_to": time_to,
+    }
     try:
-        response = requests.get(url, headers=api_headers)
+        response = birdeye_client.get("/defi/history_price", params=params)
         response.raise_for_status()  # Raise an error for bad HTTP status codes
-        data = response.json()
+        data = serialization.loads(response.content)
 
         # Check if 'items' contains data
         if data.get('success') and 'items' in data.get('data', {}):
-            items = data['data']['items']
-            if items:
-                # Assuming the first item is the relevant one
-                price_info = items[0]
-                if 'value' in price_info:
-                    price = price_info['value']
-                    return price
-                else:
-                    return None
-            else:
-                return None
-        else:
-            return None
+            return data['data']['items'] or [], None
+        return [], None
 
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching data: {e}")
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return None, f"Error fetching data: {e}"
 
-    return None  # Return None if data retrieval fails
 
+def fetch_token_price(token_address, time_from, time_to):
+    items, err = fetch_price_history(token_address, time_from, time_to)
+    if err is not None:
+        return None, err
 
-def get_token_transfers(meta, wallet_address):
-    pre_balances = {balance['accountIndex']: balance for balance in meta.get('preTokenBalances', [])}
-    post_balances = {balance['accountIndex']: balance for balance in meta.get('postTokenBalances', [])}
+    if items:
+        # Assuming the first item is the relevant one
+        return items[0].get('value'), None
+    return None, None
 
-    all_account_indexes = set(pre_balances.keys()).union(set(post_balances.keys()))
 
-    token_transfers = []
+def collect_trade_timestamps(trades, trade_timestamps):
+    for trade in trades:
+        if trade.token:
+            trade_timestamps.setdefault(trade.token, set()).add(trade.timestamp)
 
-    for index in all_account_indexes:
-        pre_balance = pre_balances.get(index)
-        post_balance = post_balances.get(index)
 
-        # Check if the owner matches the provided wallet_address
-        pre_owner = pre_balance.get('owner') if pre_balance else None
-        post_owner = post_balance.get('owner') if post_balance else None
+@metrics.timed("price_history")
+def prefetch_price_history(trade_timestamps):
+    page_seconds = PRICE_HISTORY_PAGE_SIZE * 60
 
-        if pre_owner == wallet_address or post_owner == wallet_address:
-            token_transfer = {
-                'accountIndex': index,
-                'preBalance': pre_balance,
-                'postBalance': post_balance
-            }
-            token_transfers.append(token_transfer)
+    cache = get_price_cache()
+    for token, timestamps in progress.progress_bar(trade_timestamps.items(), desc="Prefetching token price history"):
+        # Trades priced by an earlier run are served by the price cache, only the rest is downloaded
+        uncached = [timestamp for timestamp in timestamps if cache.get(token, timestamp) is MISS]
+        series = PriceSeries()
+        for time_from, time_to in plan_price_ranges(uncached, page_seconds):
+            items, err = fetch_price_history(token, time_from, time_to)
+            if err is not None:
+                logger.warning(err)
+                break
+            series.add_range(time_from, time_to, items)
+            # Same rule as get_token_price, a missing price is only final once the grace period is over
+            prices = {timestamp: series.lookup(timestamp) for timestamp in uncached
+                      if time_from <= timestamp <= time_to}
+            cache.put_many(token, {timestamp: price for timestamp, price in prices.items()
+                                   if price is not None or timestamp < time.time() - MISSING_PRICE_GRACE_PERIOD})
+        price_history.add(token, series)
 
-    return token_transfers
 
+def get_token_price(token_address, timestamp):
+    if token_address == "":
+        return None
 
-def process_transaction(transaction, wallet_address, minted_tokens):
-    stats_list = []  # List to store stats dictionaries
-    meta = transaction.get('meta', {})
+    price = price_history.lookup(token_address, timestamp)
+    metrics.record_cache("price_history", hits=price is not MISS, misses=price is MISS)
+    if price is not MISS:
+        return price
 
-    if not meta:
-        return []
+    cache = get_price_cache()
+    price = cache.get(token_address, timestamp)
+    if price is not MISS:
+        return price
 
-    token_transfers = get_token_transfers(meta, wallet_address)
-    if len(token_transfers) == 0:
-        return []
+    time_from = timestamp - 30  # 30 sec before
+    time_to = timestamp + 30  # 30 sec after
+    price, err = fetch_token_price(token_address, time_from, time_to)
+    if err is not None:
+        logger.warning(err)
+        return None
 
-    # Check for potential mints
-    inner_instructions = meta.get('innerInstructions', [])
-    if inner_instructions:
-        for inner_instruction in inner_instructions:
-            instructions = inner_instruction.get('instructions', [])
-            if instructions:
-                for instruction in instructions:
-                    parsed = instruction.get('parsed', {})
-                    if parsed and "info" in parsed:
-                        info = parsed["info"]
-                        if info and "authority" in info:
-                            authority = info["authority"]
-                            if wallet_address == authority and "mint" in info and "tokenAmount" in info:
-                                token_amount = info["tokenAmount"]
-                                token = info["mint"]
-                                price_then = get_token_price(token, transaction['blockTime'])
-                                if price_then is None:
-                                    price_then = 0.0
-                                if token not in minted_tokens:
-                                    minted_tokens.append(token)
+    if price is not None or timestamp < time.time() - MISSING_PRICE_GRACE_PERIOD:
+        cache.put(token_address, timestamp, price)
+    return price
 
-    for token_transfer in token_transfers:
 
-        pre_balance = token_transfer.get("preBalance", {})
-        post_balance = token_transfer.get("postBalance", {})
+def start_spot_snapshot():
+    # Every wallet valued under one snapshot sees the same current prices, see get_spot_prices
+    global _spot_snapshot
+    _spot_snapshot = f"{time.time_ns()}-{os.getpid()}"
+    get_price_cache().prune_spot(time.time() - SPOT_SNAPSHOT_RETENTION)
+    return _spot_snapshot
 
-        if not pre_balance and not post_balance:
-            continue
 
-        pre_token_amount = pre_balance.get("uiTokenAmount") if isinstance(pre_balance, dict) else None
-        post_token_amount = post_balance.get("uiTokenAmount") if isinstance(post_balance, dict) else None
-
-        pre_amount = 0.0
-        post_amount = 0.0
-        token = ""
-        price = 0.0
-
-        if post_token_amount and post_token_amount['uiAmount'] is not None:
-            post_amount = float(post_token_amount['uiAmount'])
-            token = post_balance["mint"]
-            price = get_token_price(token, transaction['blockTime'])
-            if price is None:
-                price = 0.0
-
-        if pre_token_amount and pre_token_amount['uiAmount'] is not None:
-            token = pre_balance["mint"]
-            pre = pre_balance['uiTokenAmount']
-            if pre == "0":
-                pre_amount = 0.0
-            else:
-                if pre['uiAmount'] is None:
-                    continue
-            pre_amount = float(pre['uiAmount'])
+def use_spot_snapshot(snapshot):
+    global _spot_snapshot
+    _spot_snapshot = snapshot
 
-        difference = abs(pre_amount - post_amount)
 
-        if post_amount > pre_amount:
-            transaction_type = "buy"
-            multiplier = -1
-        else:
-            transaction_type = "sell"
-            multiplier = 1
-
-        stats = {
-            "token": token,
-            "type": transaction_type,
-            "pre_amount": pre_amount,
-            "post_amount": post_amount,
-            "amount_difference": difference,
-            "price_usd": price,
-            "value_usd": multiplier * difference * price,
-            "timestamp": transaction['blockTime'],
-        }
-        stats_list.append(stats)
+def get_spot_snapshot():
+    # One snapshot per process unless a parent hands its own to the worker
+    if _spot_snapshot is None:
+        return start_spot_snapshot()
+    return _spot_snapshot
+
 
+def fetch_birdeye_spot_prices(token_addresses):
+    prices = {}
+    try:
+        for start in range(0, len(token_addresses), BIRDEYE_MULTI_PRICE_LIMIT):
+            chunk = token_addresses[start:start + BIRDEYE_MULTI_PRICE_LIMIT]
+            response = birdeye_client.get("/defi/multi_price", params={"list_address": ",".join(chunk)})
+            response.raise_for_status()
+            data = serialization.loads(response.content)
+            if not data.get('success'):
+                return None, f"Birdeye multi_price failed: {data.get('message')}"
+
+            # Unknown mints are missing or null in the response
+            for token_address, entry in (data.get('data') or {}).items():
+                if entry and entry.get('value') is not None:
+                    prices[token_address] = entry['value']
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return None, f"Error fetching data: {e}"
+    return prices, None
+
+
+def fetch_dexscreener_spot_prices(token_addresses):
+    prices = {}
+    liquidity = {}
+    try:
+        for start in range(0, len(token_addresses), DEXSCREENER_TOKENS_LIMIT):
+            chunk = token_addresses[start:start + DEXSCREENER_TOKENS_LIMIT]
+            response = dexscreener_client.get("/latest/dex/tokens/" + ",".join(chunk))
+            if response.status_code != 200:
+                return None, f"Error: {response.status_code} - {response.reason}"
+            data = serialization.loads(response.content)
+
+            # A token trades in several pairs, the most liquid one where it is the base token gives the quote
+            for pair in data.get('pairs') or []:
+                token_address = (pair.get('baseToken') or {}).get('address')
+                if token_address not in chunk or pair.get('priceUsd') is None:
+                    continue
+                pair_liquidity = (pair.get('liquidity') or {}).get('usd') or 0
+                if token_address not in prices or pair_liquidity > liquidity[token_address]:
+                    prices[token_address] = float(pair['priceUsd'])
+                    liquidity[token_address] = pair_liquidity
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return None, f"Request error: {e}"
+    return prices, None
+
+
+def get_spot_prices(token_addresses):
+    # The snapshot lives in the shared price cache, so wallets analysed in other worker processes
+    # reuse the prices fetched here instead of quoting the same tokens again
+    snapshot = get_spot_snapshot()
+    cache = get_price_cache()
+    token_addresses = [token_address for token_address in dict.fromkeys(token_addresses) if token_address]
+    prices = cache.get_spot(snapshot, token_addresses)
+    missing = [token_address for token_address in token_addresses if token_address not in prices]
+    if not missing:
+        return prices
+
+    resolved = {}
+    answered = False
+    for fetch_prices in (fetch_birdeye_spot_prices, fetch_dexscreener_spot_prices):
+        unresolved = [token_address for token_address in missing if token_address not in resolved]
+        if not unresolved:
+            break
+        source_prices, err = fetch_prices(unresolved)
+        if err is not None:
+            logger.warning(err)
+            continue
+        answered = True
+        resolved.update(source_prices)
+
+    # Tokens no source could price are stored too, unless every source failed and a later wallet should retry
+    if answered:
+        resolved = {token_address: resolved.get(token_address) for token_address in missing}
+    cache.put_spot(snapshot, resolved)
+    # Re-read, a concurrent worker may have stored its prices for these tokens first
+    prices.update(cache.get_spot(snapshot, missing))
+    return prices
+
+
+def price_trades(trade_lists):
+    # Price enrichment runs separately from parsing, each distinct (token, timestamp) is resolved once
+    prices = {}
+    for trades in trade_lists:
+        for trade in trades:
+            key = (trade.token, trade.timestamp)
+            if key not in prices:
+                prices[key] = get_token_price(trade.token, trade.timestamp)
+    return prices
+
+
+def trade_stats(trades, prices):
+    stats_list = []
+    for trade in trades:
+        price = prices.get((trade.token, trade.timestamp))
+        if price is None:
+            price = 0.0
+
+        multiplier = -1 if trade.side == "buy" else 1
+        stats_list.append({
+            "token": trade.token,
+            "type": trade.side,
+            "pre_amount": trade.pre_amount,
+            "post_amount": trade.post_amount,
+            "amount_difference": trade.amount,
+            "price_usd": price,
+            "value_usd": multiplier * trade.amount * price,
+            "timestamp": trade.timestamp,
+        })
     return stats_list
 
 
 def calculate_performance(data, wallet_address):
-    results = {}
-    current_timestamp = int(time.time())
-    unique_tokens = 0
-    wins = 0
-
-    for txn in tqdm(data, desc=f"Calculating performance for: {wallet_address}"):
-        for stat in txn["stats"]:
-            token = stat["token"]
-            if token == "":
-                continue
-
-            amount_difference = stat["amount_difference"]
-            price_usd = stat["price_usd"]
-            timestamp = stat["timestamp"]
-            txn_type = stat["type"]
-
-            # If price_usd is 0.0, get the price
-            if price_usd == 0.0:
-                price_usd = get_token_price(token, timestamp)
-
-            if price_usd is None:
-                continue
-
-            # Calculate value_usd
-            mp = 1
-            if txn_type == "buy":
-                mp = -1
-
-            value_usd = (amount_difference * price_usd) * mp
-
-            # Append the processed data to the dictionary
-            if token not in results:
-                results[token] = {"transactions": [], "total_value": 0}
-                unique_tokens += 1
-
-            results[token]["transactions"].append({
-                "amount_difference": amount_difference,
-                "price_usd": price_usd,
-                "value_usd": value_usd,
-                "timestamp": datetime.datetime.fromtimestamp(timestamp).isoformat()  # Convert to readable date
-            })
-            results[token]["total_value"] += value_usd
-
-    total_wallet_value = 0.0
-    total_wallet_value_current = 0.0
-
-    # Calculate current prices and current values
-    for token, info in results.items():
-        current_price_usd = get_token_price(token, current_timestamp)
-        if current_price_usd is None:
-            current_price_usd = 0.0
-
-        total_value_current = 0
-
-        for txn in info["transactions"]:
-            current_value_usd = txn["amount_difference"] * current_price_usd
-            txn["current_price_usd"] = current_price_usd
-            txn["current_value_usd"] = current_value_usd
-            total_value_current += current_value_usd
-
-        info["total_value_current"] = total_value_current
-        if info["total_value"] > 0:
-            wins += 1
-
-        total_wallet_value += info["total_value"]
-        total_wallet_value_current += total_value_current
-
-    winrate = wins / unique_tokens if unique_tokens > 0 else 0
-    results["unique_tokens"] = unique_tokens
-    results["winrate"] = winrate
-    results["value_at_transaction"] = total_wallet_value
-    results["current_value"] = total_wallet_value_current
+    with metrics.timer("ledger"):
+        trades = ledger.build_ledger(data)
+        trades = ledger.resolve_missing_prices(trades, get_token_price)
+
+    with metrics.timer("current_prices"):
+        tokens = trades["token"].unique().tolist()
+        spot_prices = get_spot_prices(tokens)
+        current_prices = {token: spot_prices.get(token) or 0.0 for token in tokens}
+
+    with metrics.timer("pnl"):
+        priced = ledger.priced_trades(trades)
+        token_pnl, totals = ledger.calculate_pnl(priced, current_prices)
+        results = ledger.to_results_json(priced, token_pnl, totals, settings.result_transactions)
+
+    # Cost basis view: realized vs unrealized PnL on the holdings left per token
+    with metrics.timer("positions"):
+        position_summaries, position_totals = positions.track_positions(
+            ledger.iter_trades(trades), current_prices, settings.cost_basis_method)
+    results["positions"] = position_summaries
+    results.update(position_totals)
 
     return results
+
+
+configure(load_settings())
@@ -0,0 +1,160 @@
+import glob
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+import core
+import ledger
+import metrics
+import serialization
+from sqlite_util import execute_in
+
+FORMATS = ("ndjson", "parquet", "none")
+
+_index = None
+
+
+def partition_path(export_format, dataset, wallet_address, day=None):
+    # Hive style partitions, the date and wallet columns live in the path rather than in the rows.
+    # Each format gets its own root so a dataset reader never sees mixed files.
+    day = day or datetime.now().strftime('%Y-%m-%d')
+    return os.path.join(core.settings.data_dir, 'export', export_format, dataset, f"date={day}",
+                        f"wallet={wallet_address}")
+
+
+def append_ndjson(directory, frame):
+    with open(os.path.join(directory, "part.ndjson"), 'ab') as f:
+        f.write(b"".join(serialization.dumps(row) + b"\n" for row in frame.to_dict("records")))
+
+
+def append_parquet(directory, frame):
+    if pq is None:
+        raise RuntimeError("export_format 'parquet' needs the pyarrow package")
+    # Parquet files can't be appended to, every write adds a part file to the partition instead
+    filename = f"part-{time.time_ns()}-{os.getpid()}.parquet"
+    pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), os.path.join(directory, filename))
+
+
+class ExportIndex:
+    # The transactions exported per wallet, so new exports are deduped without reading the dataset back.
+    # It lives next to the format's files, removing the export directory resets it too.
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS exported ("
+            "wallet TEXT NOT NULL, txn_hash TEXT NOT NULL, PRIMARY KEY (wallet, txn_hash))"
+        )
+        self._connection.execute("CREATE TABLE IF NOT EXISTS wallets (wallet TEXT PRIMARY KEY)")
+        self._connection.commit()
+
+    def known(self, wallet_address, txn_hashes):
+        with self._lock:
+            rows = execute_in(self._connection,
+                              "SELECT txn_hash FROM exported WHERE wallet = ? AND txn_hash IN ({placeholders})",
+                              txn_hashes, wallet_address)
+        return {row[0] for row in rows}
+
+    def is_indexed(self, wallet_address):
+        with self._lock:
+            return self._connection.execute("SELECT 1 FROM wallets WHERE wallet = ?", (wallet_address,)).fetchone() is not None
+
+    def add(self, wallet_address, txn_hashes):
+        with self._lock:
+            self._connection.executemany("INSERT OR IGNORE INTO exported (wallet, txn_hash) VALUES (?, ?)",
+                                         [(wallet_address, txn_hash) for txn_hash in txn_hashes])
+            self._connection.execute("INSERT OR IGNORE INTO wallets (wallet) VALUES (?)", (wallet_address,))
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+def get_index(export_format):
+    global _index
+    path = os.path.join(core.settings.data_dir, 'export', export_format, 'exported.sqlite')
+    if _index is None or _index.path != path:
+        if _index is not None:
+            _index.close()
+        _index = ExportIndex(path)
+    return _index
+
+
+def read_exported_hashes(export_format, wallet_address):
+    # Every transaction in the wallet's partitions, only read once to index exports written before the index existed
+    pattern = partition_path(export_format, "trades", wallet_address, day="*")
+    txn_hashes = set()
+    for directory in glob.glob(pattern):
+        if export_format == "parquet":
+            for path in glob.glob(os.path.join(directory, "*.parquet")):
+                txn_hashes.update(pq.read_table(path, columns=["txn_hash"]).column("txn_hash").to_pylist())
+        elif os.path.exists(os.path.join(directory, "part.ndjson")):
+            with open(os.path.join(directory, "part.ndjson"), 'rb') as f:
+                txn_hashes.update(serialization.loads(line)["txn_hash"] for line in f if line.strip())
+    return txn_hashes
+
+
+def append(dataset, wallet_address, frame):
+    export_format = core.settings.export_format
+    if export_format not in FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    if export_format == "none" or frame.empty:
+        return None
+
+    directory = partition_path(export_format, dataset, wallet_address)
+    os.makedirs(directory, exist_ok=True)
+    if export_format == "parquet":
+        append_parquet(directory, frame)
+    else:
+        append_ndjson(directory, frame)
+    return directory
+
+
+@metrics.timed("io")
+def export_trades(wallet_address, processed_transactions):
+    # A wallet can be processed again under another save type or on another day,
+    # transactions it already exported are dropped so the dataset holds each trade once
+    export_format = core.settings.export_format
+    if export_format not in FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+    if export_format == "none":
+        return None
+    if export_format == "parquet" and pq is None:
+        raise RuntimeError("export_format 'parquet' needs the pyarrow package")
+
+    index = get_index(export_format)
+    if not index.is_indexed(wallet_address):
+        index.add(wallet_address, read_exported_hashes(export_format, wallet_address))
+
+    known = index.known(wallet_address, [txn["txn_hash"] for txn in processed_transactions])
+    new_transactions = [txn for txn in processed_transactions if txn["txn_hash"] not in known]
+    trades = ledger.build_ledger(new_transactions)
+    trades["token"] = trades["token"].astype("string")
+    trades["side"] = trades["side"].astype("string")
+    directory = append("trades", wallet_address, trades)
+    # Indexed once written, a crash in between repeats these trades on the next export rather than losing them
+    index.add(wallet_address, [txn["txn_hash"] for txn in new_transactions])
+    return directory
+
+
+@metrics.timed("io")
+def export_summary(wallet_address, summary):
+    row = {key: value for key, value in summary.items() if key != "wallet"}
+    row["computed_at"] = int(time.time())
+    return append("summaries", wallet_address, pd.DataFrame([row]))
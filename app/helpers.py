@@ -1,8 +1,9 @@
-import json
 import os
 import sys
 
 import core
+import metrics
+import serialization
 
 
 def get_data_processing_choice_input():
@@ -10,6 +11,7 @@ def get_data_processing_choice_input():
         print("Choose an option:")
         print("1. Process a single wallet")
         print("2. Get top performers for a wallet")
+        print("3. Sync a watched wallet (incremental)")
         print("0. Exit")
 
         user_input = input('Your choice: ')
@@ -20,6 +22,9 @@ def get_data_processing_choice_input():
         elif user_input == '2':
             print("Selected option 2")
             return 2
+        elif user_input == '3':
+            print("Selected option 3")
+            return 3
         elif user_input == '0':
             exit_app()
         else:
@@ -64,19 +69,24 @@ def process_query(address):
     return token, error
 
 
-def save_data_to_json(data, path, filename):
+@metrics.timed("io")
+def save_data_to_json(data, path, filename, pretty=None):
+    # Compact by default, pretty printed JSON is an export option
+    if pretty is None:
+        pretty = core.settings.pretty_json
     directory = os.path.join(path, filename)
     os.makedirs(path, exist_ok=True)  # Ensure the directory exists, create if not
-    with open(directory, 'w') as f:
-        json.dump(data, f, indent=4)
+    with open(directory, 'wb') as f:
+        f.write(serialization.dumps(data, pretty=pretty))
     print(f"Data successfully saved to {directory}")
 
 
+@metrics.timed("io")
 def load_data_from_json(path, filename):
     directory = os.path.join(path, filename)
     if os.path.exists(directory):
-        with open(directory, 'r') as f:
-            return json.load(f)
+        with open(directory, 'rb') as f:
+            return serialization.loads(f.read())
     else:
         return None
 
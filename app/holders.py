@@ -0,0 +1,135 @@
+import base64
+import heapq
+import inspect
+import logging
+from typing import NamedTuple, Tuple
+
+import requests
+
+import core
+import prefilter
+import serialization
+from solana_keys import b58encode
+
+TOKEN_PROGRAM = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+TOKEN_2022_PROGRAM = "TokenzQdBNbLqP5VeYJrC3ZVzBWRACavxNHZBo5T5Z6"
+
+# SPL token account layout: mint (32 bytes), owner (32), amount (u64 little endian), then state
+TOKEN_ACCOUNT_SIZE = 165
+MINT_OFFSET = 0
+OWNER_OFFSET = 32
+AMOUNT_OFFSET = 64
+
+# A sharded scan splits the holders by the first byte of their owner, one getProgramAccounts call per value
+SHARD_COUNT = 256
+# A single call returning more token accounts than this is dropped and the scan is sharded instead
+SINGLE_SCAN_MAX_ACCOUNTS = 20000
+
+logger = logging.getLogger(__name__)
+
+
+class Holder(NamedTuple):
+    owner: str
+    # Raw amount summed over the owner's token accounts, in the token's smallest unit
+    amount: int
+    token_accounts: Tuple[str, ...]
+
+
+def build_holders_payload(mint, program, owner_prefix=None):
+    filters = [{"memcmp": {"offset": MINT_OFFSET, "bytes": mint}}]
+    # Token-2022 accounts carry extensions after the base layout, so only classic token accounts have a fixed size
+    if program == TOKEN_PROGRAM:
+        filters.append({"dataSize": TOKEN_ACCOUNT_SIZE})
+    if owner_prefix is not None:
+        filters.append({"memcmp": {"offset": OWNER_OFFSET, "bytes": b58encode(bytes([owner_prefix]))}})
+
+    return {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "getProgramAccounts",
+        "params": [program, {
+            "encoding": "base64",
+            # Only owner and amount are read, the rest of each account is never sent
+            "dataSlice": {"offset": OWNER_OFFSET, "length": AMOUNT_OFFSET + 8 - OWNER_OFFSET},
+            "filters": filters,
+        }]
+    }
+
+
+def get_token_accounts(mint, program, owner_prefix=None):
+    current_function_name = inspect.currentframe().f_code.co_name
+
+    try:
+        response = core.rpc_client.post(build_holders_payload(mint, program, owner_prefix))
+        if response.status_code != 200:
+            return None, f"Error for function {current_function_name}: {response.status_code} - {response.reason}"
+        data = serialization.loads(response.content)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return None, f"Request error for function {current_function_name}: {e}"
+
+    if "error" in data:
+        return None, f"Error for function {current_function_name}: {data['error']}"
+    return data["result"], None
+
+
+def get_mint_program(mint):
+    # A mint belongs to either token program, its holders are only scanned there
+    accounts, err = prefilter.get_multiple_accounts([mint])
+    if err is not None:
+        return None, err
+    account = accounts.get(mint)
+    if account is None or account.get("owner") not in (TOKEN_PROGRAM, TOKEN_2022_PROGRAM):
+        return None, f"{mint} is not a token mint"
+    return account["owner"], None
+
+
+def group_by_owner(token_accounts):
+    holders = {}
+    for entry in token_accounts:
+        raw = base64.b64decode(entry["account"]["data"][0])
+        owner = b58encode(raw[:32])
+        amount = int.from_bytes(raw[32:40], "little")
+        holder_amount, accounts = holders.get(owner, (0, ()))
+        holders[owner] = (holder_amount + amount, accounts + (entry["pubkey"],))
+    return holders
+
+
+def iter_holders(mint, program, sharded=False, include_empty=False):
+    # Yields one Holder per owner wallet. Owners never span shards, so grouping per response is enough to dedupe them.
+    # Unless sharded is set a single call is tried first, if it fails or holds more than SINGLE_SCAN_MAX_ACCOUNTS
+    # accounts the scan falls back to shards, so at most one bounded response is grouped at a time.
+    if not sharded:
+        token_accounts, err = get_token_accounts(mint, program)
+        if err is None and len(token_accounts) <= SINGLE_SCAN_MAX_ACCOUNTS:
+            yield from group_holders(token_accounts, include_empty)
+            return
+        logger.info(f"Single holder scan of {mint} {'failed: ' + err if err else 'is too large'}, scanning in shards")
+        # The oversized response is released before the shards are fetched
+        token_accounts = None
+
+    for owner_prefix in range(SHARD_COUNT):
+        token_accounts, err = get_token_accounts(mint, program, owner_prefix)
+        if err is not None:
+            raise RuntimeError(err)
+        yield from group_holders(token_accounts, include_empty)
+
+
+def group_holders(token_accounts, include_empty):
+    for owner, (amount, accounts) in group_by_owner(token_accounts).items():
+        if amount or include_empty:
+            yield Holder(owner, amount, accounts)
+
+
+def get_top_holders(mint, limit, sharded=False):
+    # Only the heap of the limit largest holders outlives each scanned response
+    current_function_name = inspect.currentframe().f_code.co_name
+    program, err = get_mint_program(mint)
+    if err is not None:
+        return None, err
+
+    try:
+        return heapq.nlargest(limit, iter_holders(mint, program, sharded), key=lambda holder: holder.amount), None
+    except RuntimeError as e:
+        return None, str(e)
+    except (KeyError, TypeError, ValueError) as e:
+        return None, f"Error for function {current_function_name}: unexpected account data: {e}"
@@ -0,0 +1,98 @@
+import hashlib
+import os
+import time
+
+import serialization
+
+PENDING = "pending"
+DONE = "done"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+# Wallets in these states are not run again when a job resumes
+FINISHED = (DONE, SKIPPED)
+
+
+def job_id(kind, target):
+    # One job per command and target, a rerun resumes it even after midnight
+    digest = hashlib.sha1(f"{kind}:{target}".encode()).hexdigest()[:10]
+    return f"{kind}_{digest}"
+
+
+class JobJournal:
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+
+    @classmethod
+    def open(cls, directory, job_id, kind, target, fresh=False):
+        path = os.path.join(directory, job_id + ".json")
+        if os.path.exists(path) and not fresh:
+            with open(path, "rb") as f:
+                journal = cls(path, serialization.loads(f.read()))
+            # Only an unfinished job is resumed, running a finished one again starts a new round,
+            # so a watch list is synced again on every run
+            if journal.pending():
+                return journal
+
+        now = time.time()
+        return cls(path, {"id": job_id, "kind": kind, "target": target, "created": now, "updated": now, "wallets": {}})
+
+    @classmethod
+    def load_all(cls, directory):
+        if not os.path.isdir(directory):
+            return []
+        journals = []
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith(".json"):
+                with open(os.path.join(directory, filename), "rb") as f:
+                    journals.append(cls(os.path.join(directory, filename), serialization.loads(f.read())))
+        return journals
+
+    @property
+    def id(self):
+        return self.data["id"]
+
+    @property
+    def wallets(self):
+        return self.data["wallets"]
+
+    def add_wallets(self, wallet_addresses):
+        for wallet_address in wallet_addresses:
+            self.wallets.setdefault(wallet_address, {"status": PENDING, "attempts": 0, "error": None, "summary": None})
+        self.save()
+
+    def pending(self):
+        return [wallet_address for wallet_address, entry in self.wallets.items() if entry["status"] not in FINISHED]
+
+    def counts(self):
+        counts = {PENDING: 0, DONE: 0, SKIPPED: 0, FAILED: 0}
+        for entry in self.wallets.values():
+            counts[entry["status"]] += 1
+        return counts
+
+    def record(self, wallet_address, summary, err):
+        # Saved after every wallet, so an interrupted run loses at most the wallets still in flight
+        entry = self.wallets[wallet_address]
+        entry["attempts"] += 1
+        entry["error"] = err
+        entry["summary"] = summary
+        if err is not None:
+            entry["status"] = FAILED
+        elif summary is None:
+            entry["status"] = SKIPPED
+        else:
+            entry["status"] = DONE
+        self.save()
+
+    def summaries(self):
+        return [entry["summary"] for entry in self.wallets.values() if entry["status"] == DONE]
+
+    def save(self):
+        self.data["updated"] = time.time()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary_path = self.path + ".tmp"
+        with open(temporary_path, "wb") as f:
+            f.write(serialization.dumps(self.data, pretty=True))
+        # Replace in one step, a crash mid-write never leaves a truncated journal
+        os.replace(temporary_path, self.path)
@@ -0,0 +1,143 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+LEDGER_DTYPES = {
+    "txn_hash": "string",
+    "token": "category",
+    "side": "category",
+    "pre_amount": "float64",
+    "post_amount": "float64",
+    "amount": "float64",
+    "price_usd": "float64",
+    "timestamp": "int64",
+}
+
+# Time zone offsets only change on quarter hour boundaries
+LOCAL_OFFSET_BUCKET = 900
+
+
+def build_ledger(processed_transactions):
+    # One pass over the processed stats into typed columns, no per-trade dicts are kept
+    columns = {name: [] for name in LEDGER_DTYPES}
+
+    for txn in processed_transactions:
+        for stat in txn["stats"]:
+            if stat["token"] == "":
+                continue
+            columns["txn_hash"].append(txn["txn_hash"])
+            columns["token"].append(stat["token"])
+            columns["side"].append(stat["type"])
+            columns["pre_amount"].append(stat["pre_amount"])
+            columns["post_amount"].append(stat["post_amount"])
+            columns["amount"].append(stat["amount_difference"])
+            columns["price_usd"].append(stat["price_usd"])
+            columns["timestamp"].append(stat["timestamp"])
+
+    return pd.DataFrame(columns).astype(LEDGER_DTYPES)
+
+
+def resolve_missing_prices(ledger, price_lookup):
+    # Trades recorded without a price are looked up once per (token, timestamp), a price still unknown stays NaN.
+    # The rows are kept, position tracking needs every quantity even when its value is unknown
+    missing = ledger["price_usd"] == 0.0
+    if missing.any():
+        pairs = ledger.loc[missing, ["token", "timestamp"]].drop_duplicates()
+        prices = {(token, timestamp): price_lookup(token, timestamp)
+                  for token, timestamp in pairs.itertuples(index=False)}
+        keys = zip(ledger.loc[missing, "token"], ledger.loc[missing, "timestamp"])
+        ledger.loc[missing, "price_usd"] = [prices[key] if prices[key] is not None else np.nan for key in keys]
+
+    return ledger
+
+
+def priced_trades(ledger):
+    # Value based PnL only covers the trades with a known price
+    return ledger.dropna(subset=["price_usd"]).reset_index(drop=True)
+
+
+def iter_trades(ledger):
+    # Processed transactions are stored newest first, so reversing is usually enough to get time order
+    if ledger["timestamp"].is_monotonic_decreasing:
+        ordered = ledger.iloc[::-1]
+    elif ledger["timestamp"].is_monotonic_increasing:
+        ordered = ledger
+    else:
+        ordered = ledger.sort_values("timestamp", kind="stable")
+
+    return zip(ordered["token"].astype(object).tolist(), ordered["side"].astype(object).tolist(),
+               ordered["amount"].tolist(), ordered["price_usd"].tolist(), ordered["timestamp"].tolist())
+
+
+def calculate_pnl(ledger, current_prices):
+    sign = np.where(ledger["side"] == "buy", -1.0, 1.0)
+    ledger["value_usd"] = ledger["amount"] * ledger["price_usd"] * sign
+    ledger["current_price_usd"] = ledger["token"].astype(object).map(current_prices).astype("float64").fillna(0.0)
+    ledger["current_value_usd"] = ledger["amount"] * ledger["current_price_usd"]
+
+    # sort=False keeps tokens in order of their first trade
+    token_pnl = ledger.groupby("token", observed=True, sort=False).agg(
+        total_value=("value_usd", "sum"),
+        total_value_current=("current_value_usd", "sum"),
+        trades=("value_usd", "size"),
+    )
+    token_pnl["win"] = token_pnl["total_value"] > 0
+
+    unique_tokens = len(token_pnl)
+    totals = {
+        "unique_tokens": unique_tokens,
+        "winrate": float(token_pnl["win"].mean()) if unique_tokens > 0 else 0,
+        "value_at_transaction": float(token_pnl["total_value"].sum()),
+        "current_value": float(token_pnl["total_value_current"].sum()),
+    }
+    return token_pnl, totals
+
+
+def transaction_records(ledger, tokens):
+    # Per-trade export grouped by token, built in one pass over the columns instead of per group
+    timestamps = ledger["timestamp"].to_numpy()
+    # Local time like datetime.fromtimestamp, the UTC offset is looked up once per quarter hour rather than per trade
+    buckets, inverse = np.unique(timestamps // LOCAL_OFFSET_BUCKET, return_inverse=True)
+    offsets = np.array([time.localtime(bucket * LOCAL_OFFSET_BUCKET).tm_gmtoff for bucket in buckets.tolist()],
+                       dtype="int64")
+    local_times = (timestamps + offsets[inverse]).astype("datetime64[s]")
+    columns = {
+        "amount_difference": ledger["amount"].to_numpy(),
+        "price_usd": ledger["price_usd"].to_numpy(),
+        "value_usd": ledger["value_usd"].to_numpy(),
+        "timestamp": np.datetime_as_string(local_times, unit="s"),
+        "current_price_usd": ledger["current_price_usd"].to_numpy(),
+        "current_value_usd": ledger["current_value_usd"].to_numpy(),
+    }
+    # A stable sort by token keeps each token's trades in ledger order
+    order = np.argsort(pd.Index(tokens).get_indexer(ledger["token"].astype(object)), kind="stable")
+    records = [dict(zip(columns, row)) for row in zip(*(values[order].tolist() for values in columns.values()))]
+
+    grouped = {}
+    start = 0
+    for token, count in zip(tokens, ledger["token"].value_counts(sort=False).reindex(tokens).tolist()):
+        grouped[token] = records[start:start + count]
+        start += count
+    return grouped
+
+
+def to_results_json(ledger, token_pnl, totals, transactions=False):
+    # Per-token totals, the per-trade list is an opt-in export as it costs more than the PnL itself
+    results = {}
+    tokens = token_pnl.index.astype(object).tolist()
+    records = transaction_records(ledger, tokens) if transactions else None
+
+    for token, total_value, total_value_current, trades in zip(
+            tokens, token_pnl["total_value"].tolist(), token_pnl["total_value_current"].tolist(),
+            token_pnl["trades"].tolist()):
+        results[token] = {
+            "total_value": total_value,
+            "total_value_current": total_value_current,
+            "trades": trades,
+        }
+        if records is not None:
+            results[token]["transactions"] = records[token]
+
+    results.update(totals)
+    return results
@@ -1,22 +1,88 @@
+import atexit
+import copy
 import logging
+import logging.handlers
+import multiprocessing.util
 import os
+import queue
 from datetime import datetime
 
+import serialization
 
-def setup_logging():
-    # Create logs directory if it doesn't exist
-    log_dir = './logs'
-    if not os.path.exists(log_dir):
-        os.makedirs(log_dir)
+# Standard LogRecord attributes, anything else on a record was passed with extra= and is written as a field
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
 
-    # Get current date for creating the log file name
+_listener = None
+_listener_pid = None
+
+
+class JsonFormatter(logging.Formatter):
+    # One JSON object per line
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "process": record.process,
+            "message": record.getMessage(),
+        }
+        extra = {key: value for key, value in vars(record).items() if key not in RECORD_ATTRIBUTES}
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        try:
+            return serialization.dumps({**entry, **extra}).decode()
+        except TypeError:
+            # Extra fields that can't be encoded are written as their str()
+            return serialization.dumps({**entry, **{key: str(value) for key, value in extra.items()}}).decode()
+
+
+class LocalQueueHandler(logging.handlers.QueueHandler):
+    def prepare(self, record):
+        # The queue never leaves this process, so the record is not flattened for pickling,
+        # only its arguments are merged before the caller can change them
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+def setup_logging(level=None, log_dir='./logs'):
+    # Records are queued and written by a listener thread, so logging never waits on the disk.
+    # Safe to call again, e.g. to apply the configured level once settings are loaded.
+    global _listener, _listener_pid
+    root = logging.getLogger()
+    if level is not None:
+        root.setLevel(level.upper() if isinstance(level, str) else level)
+    if _listener is not None and _listener_pid == os.getpid():
+        return
+    if level is None:
+        root.setLevel(logging.INFO)
+
+    # A forked worker inherits the queue handler but not the listener thread, so it starts its own
+    for handler in list(root.handlers):
+        if isinstance(handler, LocalQueueHandler):
+            root.removeHandler(handler)
+
+    os.makedirs(log_dir, exist_ok=True)
     current_date = datetime.now().strftime('%Y-%m-%d')
-    log_file = os.path.join(log_dir, f'app_{current_date}.log')
-
-    # Configure logging to write to the current day's log file
-    logging.basicConfig(
-        filename=log_file,
-        filemode='a',  # append mode
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        level=logging.DEBUG
-    )
+    file_handler = logging.FileHandler(os.path.join(log_dir, f'app_{current_date}.jsonl'), mode='a', encoding='utf-8')
+    file_handler.setFormatter(JsonFormatter())
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(LocalQueueHandler(log_queue))
+    _listener = logging.handlers.QueueListener(log_queue, file_handler)
+    _listener.start()
+    _listener_pid = os.getpid()
+
+    # atexit doesn't run in multiprocessing workers, their finalizers do
+    atexit.register(stop_logging)
+    multiprocessing.util.Finalize(None, stop_logging, exitpriority=0)
+
+
+def stop_logging():
+    # Writes out the records still queued
+    global _listener
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+        _listener = None
@@ -1,58 +1,130 @@
+import argparse
+import cProfile
 import logging
 import os
-import sys
+import pstats
 from datetime import datetime
-from tqdm import tqdm
+import cli
 import core
+import export
 import helpers
-from logging_config import setup_logging
+import holders
+import metrics
+import pipeline
+import prefilter
+import progress
+import runner
+from checkpoint import CheckpointLog
+import logging_config
 import pandas as pd
 
-setup_logging()
+logging_config.setup_logging()
 logger = logging.getLogger(__name__)
 
 
-def calculate_wallet_performance(wallet_address, save_type):
+def open_checkpoint(wallet_address):
+    return CheckpointLog(os.path.join(core.settings.data_dir, 'checkpoints', wallet_address + '.jsonl'))
+
+
+def sync_wallet_transactions(wallet_address):
+    # Returns the merged processed transactions and the signatures that could not be fetched
+    incremental_save_path = os.path.join(core.settings.data_dir, 'incremental')
+    processed_save_path = os.path.join(incremental_save_path, 'processed')
+    watermark_save_path = os.path.join(incremental_save_path, 'watermarks')
+
+    processed_transactions = helpers.load_data_from_json(processed_save_path, wallet_address) or []
+    watermark = helpers.load_data_from_json(watermark_save_path, wallet_address)
+    until = watermark["signature"] if watermark else None
+
+    checkpoint = open_checkpoint(wallet_address)
+    try:
+        new_transactions, newest, signature_count, failed = pipeline.process_wallet(wallet_address, until=until,
+                                                                                    checkpoint=checkpoint)
+    finally:
+        checkpoint.close()
+
+    if signature_count == 0 and watermark is not None:
+        print(f"No new transactions for {wallet_address} since slot {watermark['slot']}")
+        return processed_transactions, []
+
+    if watermark is None and signature_count < 3:
+        print(f"Account must have at least 3 valid signatures ... Count for this account: {signature_count}")
+        checkpoint.discard()
+        return None, []
+
+    # Signatures are returned newest first, keep that order across syncs
+    known_hashes = {txn["txn_hash"] for txn in new_transactions}
+    processed_transactions = new_transactions + [txn for txn in processed_transactions
+                                                 if txn["txn_hash"] not in known_hashes]
+    if failed:
+        # Nothing is saved and the watermark stays put, the next sync resumes from the checkpoint
+        print(f"{len(failed)} transactions could not be fetched for {wallet_address}, they are retried on the next sync")
+        return processed_transactions, failed
+
+    helpers.save_data_to_json(processed_transactions, processed_save_path, wallet_address)
+    export.export_trades(wallet_address, new_transactions)
+
+    # Only move the watermark once the merged set is safely on disk
+    helpers.save_data_to_json({
+        "signature": newest["signature"],
+        "slot": newest["slot"],
+        "block_time": newest.get("blockTime"),
+    }, watermark_save_path, wallet_address)
+    checkpoint.discard()
+    print(f"Synced {signature_count} new signatures for {wallet_address}")
+
+    return processed_transactions, []
+
+
+def calculate_wallet_performance(wallet_address, save_type, incremental=False):
     current_date = datetime.now().strftime('%Y-%m-%d')
-    processed_save_path = os.path.join(os.path.dirname(__file__), '', '../data', save_type, current_date, 'processed')
-    results_save_path = os.path.join(os.path.dirname(__file__), '', '../data', save_type, current_date, 'results')
+    processed_save_path = os.path.join(core.settings.data_dir, save_type, current_date, 'processed')
+    results_save_path = os.path.join(core.settings.data_dir, save_type, current_date, 'results')
     # Ensure directories exist; create if they don't
     os.makedirs(processed_save_path, exist_ok=True)
     os.makedirs(results_save_path, exist_ok=True)
 
     # Gather processed data
     processed_transactions = []
-    existing_data = helpers.load_data_from_json(processed_save_path, wallet_address)
-    if existing_data:
-        processed_transactions = existing_data
+    failed = []
+    if incremental:
+        processed_transactions, failed = sync_wallet_transactions(wallet_address)
+        if processed_transactions is None:
+            return None
     else:
-        signatures, err = core.get_transaction_signatures(wallet_address)
-        if err is not None:
-            print(err)
-            raise Exception(err)
-        if len(signatures) < 3:
-            print(f"Account must have at least 3 valid signatures ... Count for this account: {len(signatures)}")
-            helpers.exit_app()
-
-        minted_tokens = []
-        for signature in tqdm(signatures, desc=f"Processing transaction signatures for address: {wallet_address}"):
-            txn_hash = signature["signature"]
-            transaction, err = core.get_transaction_details(txn_hash)
-            if err is not None:
-                print(err)
-                raise Exception(err)
-
-            result = core.process_transaction(transaction, wallet_address, minted_tokens)
-            if len(result) > 0:
-                result_list = {"txn_hash": txn_hash, "stats": result}
-                processed_transactions.append(result_list)
-
-        if len(processed_transactions) > 0:
-            helpers.save_data_to_json(processed_transactions, processed_save_path, wallet_address)
+        existing_data = helpers.load_data_from_json(processed_save_path, wallet_address)
+        if existing_data:
+            processed_transactions = existing_data
+        else:
+            checkpoint = open_checkpoint(wallet_address)
+            try:
+                processed_transactions, _, signature_count, failed = pipeline.process_wallet(wallet_address,
+                                                                                             checkpoint=checkpoint)
+            finally:
+                checkpoint.close()
+
+            if signature_count < 3:
+                print(f"Account must have at least 3 valid signatures ... Count for this account: {signature_count}")
+                checkpoint.discard()
+                return None
+
+            if failed:
+                print(f"{len(failed)} transactions could not be fetched, they are retried on the next run")
+            else:
+                if len(processed_transactions) > 0:
+                    helpers.save_data_to_json(processed_transactions, processed_save_path, wallet_address)
+                    export.export_trades(wallet_address, processed_transactions)
+                checkpoint.discard()
+
+    # A partial wallet is never summarised, raising lets the job journal mark it failed so it is retried
+    # and keeps it out of the leaderboard, the next run resumes from the checkpoint
+    if failed:
+        raise Exception(f"{len(failed)} transactions could not be fetched for {wallet_address}")
 
     # Gather results
     results = []
-    existing_results = helpers.load_data_from_json(results_save_path, wallet_address)
+    # Synced wallets may have new transactions, so their results are always recomputed
+    existing_results = None if incremental else helpers.load_data_from_json(results_save_path, wallet_address)
     if existing_results:
         results = existing_results
     else:
@@ -60,80 +132,174 @@ def calculate_wallet_performance(wallet_address, save_type):
         if len(results) > 0:
             helpers.save_data_to_json(results, results_save_path, wallet_address)
 
-    total_value = 0.0
-    total_value_current = 0.0
-    df = pd.DataFrame(columns=["wallet", "pnl", "current_value", "win_rate", "unique_tokens_traded"])
-
-    for token, info in results.items():
-        if not isinstance(info, dict):
-            continue  # Skip entries that are not dictionaries
-
-        total_value += info['total_value']
-        total_value_current += info['total_value_current']
+    total_value = results.get("value_at_transaction", 0.0)
+    total_value_current = results.get("current_value", 0.0)
+    realized_pnl = results.get("realized_pnl")
+    unrealized_pnl = results.get("unrealized_pnl")
+    df = pd.DataFrame(columns=["wallet", "pnl", "current_value", "win_rate", "unique_tokens_traded",
+                               "realized_pnl", "unrealized_pnl", "roi"])
 
     print(f"PnL for wallet at transaction time: {format(total_value, '.2f')}$")
     print(f"PnL for wallet at current time: {format(total_value_current, '.2f')}$")
+    if realized_pnl is not None:
+        print(f"Realized PnL ({results['cost_basis_method']}): {format(realized_pnl, '.2f')}$")
+        print(f"Unrealized PnL on current holdings: {format(unrealized_pnl, '.2f')}$")
 
     df["wallet"] = [wallet_address]
     df["pnl"] = [format(total_value, '.4f')]
     df["current_value"] = [format(total_value_current, '.4f')]
     df["win_rate"] = [format(results.get("winrate", 0), '.2f')]
     df["unique_tokens_traded"] = [results.get("unique_tokens", 0)]
+    df["realized_pnl"] = [format(realized_pnl or 0.0, '.4f')]
+    df["unrealized_pnl"] = [format(unrealized_pnl or 0.0, '.4f')]
+    df["roi"] = [format(results.get("roi") or 0.0, '.4f')]
     csv_path = os.path.join(results_save_path, wallet_address+".csv")
     df.to_csv(csv_path, index=False)
     print(f"DataFrame saved as {wallet_address}.csv")
+    logger.info(f"Price cache stats for {wallet_address}: {core.get_price_cache().stats()}")
+    logger.info(f"Transaction store stats for {wallet_address}: {core.get_transaction_store().stats()}")
+
+    summary = {
+        "wallet": wallet_address,
+        "pnl": total_value,
+        "current_value": total_value_current,
+        "win_rate": results.get("winrate", 0),
+        "unique_tokens_traded": results.get("unique_tokens", 0),
+        "realized_pnl": realized_pnl or 0.0,
+        "unrealized_pnl": unrealized_pnl or 0.0,
+        "roi": results.get("roi") or 0.0,
+    }
+    # Results loaded from an earlier run were exported by that run
+    if not existing_results:
+        export.export_summary(wallet_address, summary)
+    return summary
 
 
 def get_top_performers(token_address):
     # Display token info
-    with tqdm(total=1, desc="Processing query") as pbar:
+    with progress.progress_bar(total=1, desc="Processing query") as pbar:
         token, err = helpers.process_query(token_address)
         pbar.update(1)
 
     if err is not None:
-        print(f"Error processing token address: {err}")
-    else:
-        helpers.print_token_details(token)
+        return None, f"Error processing token address: {err}"
+    helpers.print_token_details(token)
     print("\n")
 
     if token['chainId'] != "solana":
-        print(f"Chain {token['chainId']} is currently not supported for wallet analysis!")
-        sys.exit()
+        return None, f"Chain {token['chainId']} is currently not supported for wallet analysis!"
 
-    # Get applicable wallets
-    with tqdm(total=1, desc="Fetching wallets that interacted with the token") as pbar:
-        wallets, err = core.get_interacting_wallets_sol(token_address)
+    # Get applicable wallets, the full holder scan finds every owner and keeps the largest ones
+    with progress.progress_bar(total=1, desc="Scanning token holders") as pbar:
+        top_holders, err = holders.get_top_holders(token_address, core.settings.holder_limit,
+                                                   core.settings.holder_scan_sharded)
+        pbar.update(1)
+
+    owners = None
+    if err is None:
+        owners = {holder.owner: list(holder.token_accounts) for holder in top_holders}
+    else:
+        # Many public RPCs disable getProgramAccounts for the token program
+        print(f"Holder scan failed ({err}), falling back to the 20 largest token accounts")
+        with progress.progress_bar(total=1, desc="Fetching wallets that interacted with the token") as pbar:
+            wallets, err = core.get_interacting_wallets_sol(token_address)
+            pbar.update(1)
+
+        if err is not None:
+            return None, f"Error fetching wallets: {err}"
+
+    # Pools, program accounts, bots and one-time traders are dropped before the expensive analysis
+    with progress.progress_bar(total=1, desc="Screening wallet owners") as pbar:
+        if owners is not None:
+            screenings, err = prefilter.screen_owners(owners)
+        else:
+            screenings, err = prefilter.screen_wallets([wallet["address"] for wallet in wallets])
         pbar.update(1)
 
     if err is not None:
-        print(f"Error fetching wallets: {err}")
-        sys.exit()
+        return None, f"Error screening wallets: {err}"
+
+    for screening in screenings:
+        logger.info(f"Screened {screening.owner}: {screening.category}, {screening.signature_count} sampled signatures")
+    skipped = [screening for screening in screenings if screening.category != "wallet"]
+    if skipped:
+        print(f"Skipping {len(skipped)} of {len(screenings)} holders: " +
+              ", ".join(f"{screening.owner} ({screening.category})" for screening in skipped))
 
     print("Done")
-    return wallets
+    return [screening.owner for screening in screenings if screening.category == "wallet"], None
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Walko, a blockchain wallet analyzer",
+                                     epilog="For scripted runs, see cli.py")
+    cli.add_settings_arguments(parser)
+    return parser
+
+
+def run_menu():
+    user_choice = helpers.get_data_processing_choice_input()
+
+    if user_choice == 1:
+        wallet_address = helpers.get_address("wallet")
+        calculate_wallet_performance(wallet_address, "single")
+    elif user_choice == 2:
+        token_address = helpers.get_address("tokan")
+        wallets, err = get_top_performers(token_address)
+        if err is not None:
+            print(err)
+            return
+        summaries, failures = runner.run_wallets(wallets, calculate_wallet_performance, "multi")
+        leaderboard_path = os.path.join(core.settings.data_dir, 'multi', datetime.now().strftime('%Y-%m-%d'), 'results')
+        runner.save_leaderboard(summaries, leaderboard_path, f"leaderboard_{token_address}")
+        if failures:
+            print(f"{len(failures)} wallets failed, see the log for details")
+    elif user_choice == 3:
+        wallet_address = helpers.get_address("wallet")
+        calculate_wallet_performance(wallet_address, "watched", incremental=True)
+
+
+def report_run(profiler=None):
+    run_name = datetime.now().strftime('%H%M%S')
+    diagnostics_path = os.path.join(core.settings.data_dir, 'diagnostics', datetime.now().strftime('%Y-%m-%d'))
+
+    print("\n" + metrics.summary())
+    metrics_path = metrics.dump(diagnostics_path, f"metrics_{run_name}")
+    print(f"Metrics saved as {metrics_path}")
+
+    if profiler is not None:
+        profile_path = os.path.join(diagnostics_path, f"profile_{run_name}.prof")
+        profiler.dump_stats(profile_path)
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+        print(f"Profile saved as {profile_path}")
 
 
 def main():
+    parser = build_parser()
+    args = parser.parse_args()
+    settings = cli.load_cli_settings(parser, args)
+    logging_config.setup_logging(settings.log_level)
+    core.configure(settings)
+    profiler = cProfile.Profile() if args.profile else None
+
     try:
         print("\n")
         helpers.print_decorative_message("Welcome to Walko, a blockchain wallet analyzer!")
         print("\n")
 
-        user_choice = helpers.get_data_processing_choice_input()
-
-        if user_choice == 1:
-            wallet_address = helpers.get_address("wallet")
-            calculate_wallet_performance(wallet_address, "single")
-        elif user_choice == 2:
-            token_address = helpers.get_address("tokan")
-            wallets = get_top_performers(token_address)
-            for wallet in tqdm(wallets, desc="Calculating performance for top wallets"):
-                calculate_wallet_performance(wallet["address"], "multi")
-                print(f"{wallet['address']} done")
+        if profiler is not None:
+            profiler.enable()
+        try:
+            run_menu()
+        finally:
+            if profiler is not None:
+                profiler.disable()
 
+        report_run(profiler)
         helpers.exit_app()
 
     except Exception as e:
+        print(f"An error occurred: {e}")
         logger.error(f'An error occurred: {e}', exc_info=True)
 
 
@@ -0,0 +1,151 @@
+import contextlib
+import copy
+import functools
+import os
+import threading
+import time
+
+import serialization
+
+# Upper bounds, in milliseconds, of the request latency histogram buckets
+LATENCY_BUCKETS = (50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+_lock = threading.Lock()
+
+
+def empty():
+    return {"stages": {}, "requests": {}, "limiter_wait": {}, "caches": {}}
+
+
+_metrics = empty()
+
+
+def latency_bucket(seconds):
+    milliseconds = seconds * 1000
+    for bound in LATENCY_BUCKETS:
+        if milliseconds <= bound:
+            return f"<={bound}ms"
+    return f">{LATENCY_BUCKETS[-1]}ms"
+
+
+@contextlib.contextmanager
+def timer(stage):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start)
+
+
+def timed(stage):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def record_stage(stage, seconds):
+    with _lock:
+        entry = _metrics["stages"].setdefault(stage, {"calls": 0, "seconds": 0.0})
+        entry["calls"] += 1
+        entry["seconds"] += seconds
+
+
+def record_request(endpoint, seconds, status, bytes_sent=0, bytes_received=0):
+    with _lock:
+        entry = _metrics["requests"].setdefault(endpoint, {
+            "count": 0, "seconds": 0.0, "bytes_sent": 0, "bytes_received": 0, "statuses": {}, "latency": {},
+        })
+        entry["count"] += 1
+        entry["seconds"] += seconds
+        entry["bytes_sent"] += bytes_sent
+        entry["bytes_received"] += bytes_received
+        entry["statuses"][str(status)] = entry["statuses"].get(str(status), 0) + 1
+        bucket = latency_bucket(seconds)
+        entry["latency"][bucket] = entry["latency"].get(bucket, 0) + 1
+
+
+def record_wait(endpoint, seconds):
+    with _lock:
+        entry = _metrics["limiter_wait"].setdefault(endpoint, {"calls": 0, "blocked": 0, "seconds": 0.0})
+        entry["calls"] += 1
+        if seconds > 0:
+            entry["blocked"] += 1
+            entry["seconds"] += seconds
+
+
+def record_cache(name, hits=0, misses=0):
+    with _lock:
+        entry = _metrics["caches"].setdefault(name, {"hits": 0, "misses": 0})
+        entry["hits"] += hits
+        entry["misses"] += misses
+
+
+def snapshot():
+    with _lock:
+        return copy.deepcopy(_metrics)
+
+
+def reset():
+    global _metrics
+    with _lock:
+        _metrics = empty()
+
+
+def _merge(target, source):
+    for key, value in source.items():
+        if isinstance(value, dict):
+            _merge(target.setdefault(key, {}), value)
+        else:
+            target[key] = target.get(key, 0) + value
+
+
+def merge(other):
+    # Worker processes keep their own metrics, the runner folds them into the parent's
+    with _lock:
+        _merge(_metrics, other)
+
+
+def report():
+    data = snapshot()
+    for entry in data["requests"].values():
+        entry["mean_ms"] = entry["seconds"] / entry["count"] * 1000 if entry["count"] else 0.0
+    for entry in data["caches"].values():
+        lookups = entry["hits"] + entry["misses"]
+        entry["hit_ratio"] = entry["hits"] / lookups if lookups else 0.0
+    return data
+
+
+def summary():
+    data = report()
+    lines = ["Stages (cumulative, concurrent stages can exceed wall time):"]
+    for stage, entry in sorted(data["stages"].items(), key=lambda item: -item[1]["seconds"]):
+        lines.append(f"  {stage:<20} {entry['seconds']:>10.2f}s  {entry['calls']:>8} calls")
+
+    lines.append("Requests:")
+    for endpoint, entry in data["requests"].items():
+        statuses = ", ".join(f"{status}: {count}" for status, count in sorted(entry["statuses"].items()))
+        lines.append(f"  {endpoint:<20} {entry['count']:>8} requests  {entry['mean_ms']:>8.1f}ms mean  "
+                     f"{entry['bytes_sent'] / 1024:.1f} KiB sent  {entry['bytes_received'] / 1024:.1f} KiB received  "
+                     f"({statuses})")
+
+    lines.append("Rate limiter:")
+    for endpoint, entry in data["limiter_wait"].items():
+        lines.append(f"  {endpoint:<20} {entry['seconds']:>10.2f}s blocked on {entry['blocked']} of {entry['calls']} calls")
+
+    lines.append("Caches:")
+    for name, entry in data["caches"].items():
+        lines.append(f"  {name:<20} {entry['hit_ratio']:>9.1%} hits  ({entry['hits']} hits, {entry['misses']} misses)")
+
+    return "\n".join(lines)
+
+
+def dump(path, filename):
+    os.makedirs(path, exist_ok=True)
+    file_path = os.path.join(path, filename + ".json")
+    with open(file_path, "wb") as f:
+        f.write(serialization.dumps(report(), pretty=True))
+    return file_path
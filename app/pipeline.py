@@ -0,0 +1,315 @@
+import asyncio
+import logging
+import os
+import time
+
+import aiohttp
+import core
+import metrics
+import progress
+import serialization
+import tx_parser
+from rate_limiter import backoff_delay
+from run_cache import RunCache
+
+# Seconds between checks on transactions another wallet worker is fetching
+IN_FLIGHT_POLL_INTERVAL = 0.25
+
+logger = logging.getLogger(__name__)
+
+_run_cache = None
+
+
+def use_run_cache(path):
+    # Set in the workers of a multi-wallet run, so wallets share fetches and parsed trades
+    global _run_cache
+    _run_cache = RunCache(path) if path is not None else None
+
+
+async def post(session, body):
+    # The body is read inside the request so latency and size are recorded per call
+    start = time.perf_counter()
+    status = "error"
+    content = b""
+    try:
+        async with session.post(core.rpc_client.base_url, data=body) as response:
+            status = response.status
+            content = await response.read()
+            return response, content
+    finally:
+        metrics.record_request("rpc", time.perf_counter() - start, status, len(body), len(content))
+
+
+async def fetch_transaction_batch(session, signatures, max_retries=3):
+    function_name = "fetch_transaction_batch"
+    results = {}
+    pending = list(signatures)
+
+    for attempt in range(max_retries):
+        await core.rate_limiter.acquire_async("rpc")
+        payload = core.build_transaction_batch_payload(pending)
+        try:
+            response, content = await post(session, serialization.dumps(payload))
+            if response.status == 200:
+                core.rate_limiter.record_success("rpc")
+                # Only the entries that failed are sent again
+                batch_results, pending = core.map_batch_responses(
+                    pending, serialization.decode(content, serialization.TransactionBatchResponse))
+                results.update(batch_results)
+                await asyncio.to_thread(core.get_transaction_store().put_many, batch_results)
+                if not pending:
+                    return results, None
+                await asyncio.sleep(backoff_delay(attempt))
+            elif response.status == 429:
+                # The next acquire waits out Retry-After or the jittered backoff
+                core.rate_limiter.record_throttle("rpc", response.headers.get("Retry-After"), attempt)
+            else:
+                return None, f"Error for function {function_name}: {response.status} - {response.reason}"
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            return None, f"Request error for function {function_name}: {e}"
+
+    return None, f"Error for function {function_name}: {len(pending)} transactions failed after {max_retries} attempts"
+
+
+async def post_rpc(session, payload, shape=None, max_retries=3):
+    for attempt in range(max_retries):
+        await core.rate_limiter.acquire_async("rpc")
+        response, content = await post(session, serialization.dumps(payload))
+        if response.status == 200:
+            core.rate_limiter.record_success("rpc")
+            return serialization.decode(content, shape), None
+        elif response.status == 429:
+            core.rate_limiter.record_throttle("rpc", response.headers.get("Retry-After"), attempt)
+        else:
+            return None, f"{response.status} - {response.reason}"
+
+    return None, f"429 - Too Many Requests after {max_retries} attempts"
+
+
+async def iter_signature_batches(session, wallet_address, until, batch_size):
+    function_name = "iter_signature_batches"
+    before = None
+
+    while True:
+        try:
+            payload = core.build_signatures_payload(wallet_address, before, until)
+            data, err = await post_rpc(session, payload, serialization.SignaturesResponse)
+        except (aiohttp.ClientError, asyncio.TimeoutError, ValueError) as e:
+            raise Exception(f"Request error for function {function_name}: {e}")
+        if err is not None:
+            raise Exception(f"Error for function {function_name}: {err}")
+        if "error" in data:
+            raise Exception(f"Error for function {function_name}: {data['error']}")
+
+        page = core.filter_signatures(data["result"])
+        for start in range(0, len(page), batch_size):
+            yield page[start:start + batch_size]
+
+        if len(data["result"]) < core.SIGNATURE_PAGE_SIZE:
+            return
+        before = data["result"][-1]["signature"]
+
+
+class PipelineRun:
+    def __init__(self, wallet_address, batch_size, checkpoint=None):
+        self.wallet_address = wallet_address
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint
+        # Only hashes and parsed trades are kept for the whole wallet, payloads live in the transaction store
+        self.txn_hashes = []
+        self.trades = {}
+        self.trade_timestamps = {}
+        self.minted_tokens = set()
+        self.newest_signature = None
+        # Signatures that could not be fetched, mapped to the last error
+        self.failed = {}
+        self.run_cache = _run_cache
+        if self.run_cache is not None:
+            self.claimant = f"{os.getpid()}:{wallet_address}"
+            self.owners = self.run_cache.owners | {wallet_address}
+
+    async def fetch(self, session, batches):
+        store = core.get_transaction_store()
+        workers = core.settings.max_concurrent_connections
+        queue = asyncio.Queue(maxsize=max(1, core.settings.max_pending_signatures // self.batch_size))
+        pbar = progress.progress_bar(desc=f"Fetching transactions for address: {self.wallet_address}", unit="txn")
+
+        async def produce():
+            async for batch in batches:
+                if self.newest_signature is None and batch:
+                    self.newest_signature = batch[0]
+                txn_hashes = [signature["signature"] for signature in batch]
+                self.txn_hashes.extend(txn_hashes)
+                pending = self.restore(txn_hashes)
+                pbar.update(len(txn_hashes) - len(pending))
+                # Blocks while the fetchers are behind, which bounds the signatures held in memory
+                if pending:
+                    await queue.put(pending)
+            for _ in range(workers):
+                await queue.put(None)
+
+        async def consume():
+            while True:
+                batch = await queue.get()
+                if batch is None:
+                    return
+                await self.fetch_batch(session, store, batch)
+                pbar.update(len(batch))
+
+        tasks = [asyncio.create_task(produce())] + [asyncio.create_task(consume()) for _ in range(workers)]
+        try:
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                task.cancel()
+            pbar.close()
+
+        await self.retry_failed(session, store)
+
+    async def fetch_batch(self, session, store, batch):
+        if self.run_cache is not None:
+            batch = await self.take_shared(batch)
+        transactions = await asyncio.to_thread(store.get_many, batch)
+        missing = [txn_hash for txn_hash in batch if txn_hash not in transactions]
+
+        in_flight = []
+        if missing and self.run_cache is not None:
+            claimed = await asyncio.to_thread(self.run_cache.claim, missing, self.claimant)
+            in_flight = [txn_hash for txn_hash in missing if txn_hash not in claimed]
+            missing = [txn_hash for txn_hash in missing if txn_hash in claimed]
+
+        if missing:
+            fetched, err = await fetch_transaction_batch(session, missing)
+            if err is not None:
+                # Recorded and retried later instead of aborting the whole wallet
+                self.record_failed(missing, err)
+            else:
+                transactions.update(fetched)
+
+        await asyncio.to_thread(self.parse, transactions)
+        # Waited on only after this wallet's own claims are fetched, so two workers never wait on each other
+        if in_flight:
+            await self.wait_in_flight(session, store, in_flight)
+
+    async def take_shared(self, batch):
+        # Returns the signatures no other wallet of the run has parsed yet
+        shared = await asyncio.to_thread(self.run_cache.get_parsed, batch, self.wallet_address)
+        if shared:
+            self.record_results(shared)
+        return [txn_hash for txn_hash in batch if txn_hash not in shared]
+
+    async def wait_in_flight(self, session, store, txn_hashes):
+        while txn_hashes:
+            await asyncio.sleep(IN_FLIGHT_POLL_INTERVAL)
+            txn_hashes = await self.take_shared(txn_hashes)
+            # Claims released after a failed fetch, or gone stale, are fetched here instead
+            claimed = await asyncio.to_thread(self.run_cache.claim, txn_hashes, self.claimant) if txn_hashes else set()
+            if claimed:
+                await self.fetch_batch(session, store, [txn_hash for txn_hash in txn_hashes if txn_hash in claimed])
+                txn_hashes = [txn_hash for txn_hash in txn_hashes if txn_hash not in claimed]
+
+    async def retry_failed(self, session, store):
+        # One more pass once the crawl is done, by then the limiter has usually recovered
+        failed = list(self.failed)
+        if not failed:
+            return
+        logger.info(f"Retrying {len(failed)} failed transactions for {self.wallet_address}")
+        self.failed = {}
+        for start in range(0, len(failed), self.batch_size):
+            await self.fetch_batch(session, store, failed[start:start + self.batch_size])
+
+    def record_failed(self, txn_hashes, err):
+        logger.warning(f"{len(txn_hashes)} transactions failed for {self.wallet_address}: {err}")
+        self.failed.update((txn_hash, err) for txn_hash in txn_hashes)
+        if self.checkpoint is not None:
+            self.checkpoint.record_failed(txn_hashes, err)
+        if self.run_cache is not None:
+            self.run_cache.release(txn_hashes, self.claimant)
+
+    def restore(self, txn_hashes):
+        # Signatures processed before a restart come from the checkpoint, the rest still has to be fetched
+        if self.checkpoint is None:
+            return txn_hashes
+        pending = []
+        for txn_hash in txn_hashes:
+            restored = self.checkpoint.processed.get(txn_hash)
+            if restored is None:
+                pending.append(txn_hash)
+            else:
+                self.add_trades(txn_hash, *restored)
+        return pending
+
+    def add_trades(self, txn_hash, trades, minted):
+        if trades:
+            self.trades[txn_hash] = trades
+            core.collect_trade_timestamps(trades, self.trade_timestamps)
+        self.minted_tokens.update(minted)
+
+    def parse(self, transactions):
+        # Parsing is pure CPU work, payloads are dropped as soon as their trades are extracted
+        results = {}
+        shared = {}
+        with metrics.timer("parse"):
+            for txn_hash, transaction in transactions.items():
+                trades, minted = [], []
+                if self.run_cache is not None:
+                    # Parsed once for every wallet of the run, the others pick their trades up from the run cache
+                    shared[txn_hash] = {}
+                    if transaction is not None:
+                        shared[txn_hash] = tx_parser.parse_transaction_owners(transaction, self.owners)
+                    trades, minted = shared[txn_hash].get(self.wallet_address, ([], []))
+                elif transaction is not None:
+                    trades, minted = tx_parser.parse_transaction(transaction, self.wallet_address)
+                results[txn_hash] = (trades, minted)
+
+        if shared:
+            self.run_cache.put_parsed(shared)
+        self.record_results(results)
+
+    def record_results(self, results):
+        for txn_hash, (trades, minted) in results.items():
+            self.add_trades(txn_hash, trades, minted)
+        if self.checkpoint is not None:
+            self.checkpoint.record_processed(results)
+
+    def process(self):
+        processed_transactions = []
+        with metrics.timer("price_trades"):
+            prices = core.price_trades(progress.progress_bar(self.trades.values(),
+                                                             desc=f"Pricing trades for address: {self.wallet_address}"))
+
+        # Keep the original signature order regardless of fetch completion order
+        for txn_hash in self.txn_hashes:
+            trades = self.trades.get(txn_hash)
+            if trades:
+                processed_transactions.append({"txn_hash": txn_hash, "stats": core.trade_stats(trades, prices)})
+
+        return processed_transactions
+
+    async def run(self, batches, minted_tokens):
+        with metrics.timer("fetch"):
+            async with core.rpc_client.create_async_session() as session:
+                await self.fetch(session, batches(session))
+
+        # Price every traded token over its whole span up front, so enrichment resolves prices locally
+        await asyncio.to_thread(core.prefetch_price_history, self.trade_timestamps)
+        processed_transactions = await asyncio.to_thread(self.process)
+        minted_tokens.extend(token for token in self.minted_tokens if token not in minted_tokens)
+        return processed_transactions
+
+
+def process_wallet(wallet_address, until=None, minted_tokens=None, batch_size=None, checkpoint=None):
+    # Streams signature pages into the fetchers
+    # Returns the processed transactions, the newest signature, the signature count and the signatures that failed
+    batch_size = batch_size or core.settings.transaction_batch_size
+    run = PipelineRun(wallet_address, batch_size, checkpoint)
+
+    def batches(session):
+        return iter_signature_batches(session, wallet_address, until, batch_size)
+
+    processed_transactions = asyncio.run(run.run(batches, minted_tokens if minted_tokens is not None else []))
+    return processed_transactions, run.newest_signature, len(run.txn_hashes), list(run.failed)
+
@@ -0,0 +1,165 @@
+import collections
+import math
+
+COST_BASIS_METHODS = ("fifo", "average")
+
+
+class Position:
+    __slots__ = (
+        "method", "lots", "amount", "cost", "open_time",
+        "bought_amount", "bought_cost", "sold_amount", "proceeds", "realized_pnl",
+        "unmatched_sell_amount", "matched_amount", "held_seconds", "first_trade", "last_trade",
+        "unpriced_amount", "excluded_amount",
+    )
+
+    def __init__(self, method):
+        if method not in COST_BASIS_METHODS:
+            raise ValueError(f"Unknown cost basis method: {method}")
+
+        self.method = method
+        # FIFO keeps open lots as [amount, price, timestamp], average cost keeps one pooled lot
+        self.lots = collections.deque()
+        self.amount = 0.0
+        self.cost = 0.0
+        self.open_time = 0.0
+        self.bought_amount = 0.0
+        self.bought_cost = 0.0
+        self.sold_amount = 0.0
+        self.proceeds = 0.0
+        self.realized_pnl = 0.0
+        self.unmatched_sell_amount = 0.0
+        self.matched_amount = 0.0
+        self.held_seconds = 0.0
+        self.first_trade = None
+        self.last_trade = None
+        # Open amount bought at an unknown price, and amount sold whose PnL is unknown and left out
+        self.unpriced_amount = 0.0
+        self.excluded_amount = 0.0
+
+    def _touch(self, timestamp):
+        if self.first_trade is None:
+            self.first_trade = timestamp
+        self.last_trade = timestamp
+
+    def buy(self, amount, price, timestamp):
+        self._touch(timestamp)
+        self.bought_amount += amount
+
+        if self.method == "fifo":
+            self.lots.append([amount, price, timestamp])
+        elif self.amount + amount > 0:
+            # Amount weighted open time, so holding durations stay meaningful for pooled lots
+            self.open_time = (self.open_time * self.amount + timestamp * amount) / (self.amount + amount)
+        self.amount += amount
+        # An unknown price still opens the lot, so later sells match the right quantities
+        if math.isnan(price):
+            self.unpriced_amount += amount
+        else:
+            self.bought_cost += amount * price
+            self.cost += amount * price
+
+    def sell(self, amount, price, timestamp):
+        self._touch(timestamp)
+        self.sold_amount += amount
+        priced = not math.isnan(price)
+        if priced:
+            self.proceeds += amount * price
+
+        matched = min(amount, self.amount)
+        if self.method == "fifo":
+            matched_cost, matched_unpriced = self._consume_lots(matched, timestamp)
+        elif self.amount > 0:
+            matched_cost = self.cost * matched / self.amount
+            matched_unpriced = self.unpriced_amount * matched / self.amount
+            self.held_seconds += matched * (timestamp - self.open_time)
+        else:
+            matched_cost = matched_unpriced = 0.0
+
+        self.amount -= matched
+        self.cost -= matched_cost
+        self.unpriced_amount -= matched_unpriced
+        self.matched_amount += matched
+        if priced:
+            self.realized_pnl += (matched - matched_unpriced) * price - matched_cost
+            self.excluded_amount += matched_unpriced
+        else:
+            self.excluded_amount += matched
+
+        # Tokens sold without a recorded buy (mints, airdrops, transfers in) have no cost basis
+        unmatched = amount - matched
+        if unmatched > 0:
+            self.unmatched_sell_amount += unmatched
+            if priced:
+                self.realized_pnl += unmatched * price
+            else:
+                self.excluded_amount += unmatched
+
+    def _consume_lots(self, amount, timestamp):
+        matched_cost = 0.0
+        matched_unpriced = 0.0
+        while amount > 0 and self.lots:
+            lot = self.lots[0]
+            used = min(amount, lot[0])
+            if math.isnan(lot[1]):
+                matched_unpriced += used
+            else:
+                matched_cost += used * lot[1]
+            self.held_seconds += used * (timestamp - lot[2])
+            lot[0] -= used
+            amount -= used
+            if lot[0] <= 0:
+                self.lots.popleft()
+        return matched_cost, matched_unpriced
+
+    def summary(self, current_price):
+        # Holdings without a cost basis are left out rather than counted as free
+        unrealized_pnl = (self.amount - self.unpriced_amount) * current_price - self.cost
+        total_pnl = self.realized_pnl + unrealized_pnl
+        return {
+            "bought_amount": self.bought_amount,
+            "sold_amount": self.sold_amount,
+            "remaining_amount": self.amount,
+            "cost_basis": self.cost,
+            "realized_pnl": self.realized_pnl,
+            "unrealized_pnl": unrealized_pnl,
+            "total_pnl": total_pnl,
+            "roi": total_pnl / self.bought_cost if self.bought_cost > 0 else None,
+            "avg_holding_seconds": self.held_seconds / self.matched_amount if self.matched_amount > 0 else None,
+            "unmatched_sell_amount": self.unmatched_sell_amount,
+            "unpriced_amount": self.unpriced_amount,
+            "excluded_amount": self.excluded_amount,
+            "first_trade": self.first_trade,
+            "last_trade": self.last_trade,
+        }
+
+
+def track_positions(trades, current_prices, method="fifo"):
+    # trades yields (token, side, amount, price, timestamp) in time order, each trade is visited once.
+    # A NaN price marks a trade that could not be priced, its quantity is tracked but its value is not
+    positions = {}
+    for token, side, amount, price, timestamp in trades:
+        position = positions.get(token)
+        if position is None:
+            position = positions[token] = Position(method)
+
+        if side == "buy":
+            position.buy(amount, price, timestamp)
+        else:
+            position.sell(amount, price, timestamp)
+
+    summaries = {token: position.summary(current_prices.get(token) or 0.0) for token, position in positions.items()}
+
+    realized_pnl = sum(summary["realized_pnl"] for summary in summaries.values())
+    unrealized_pnl = sum(summary["unrealized_pnl"] for summary in summaries.values())
+    invested = sum(position.bought_cost for position in positions.values())
+    wins = sum(1 for summary in summaries.values() if summary["total_pnl"] > 0)
+    totals = {
+        "cost_basis_method": method,
+        "realized_pnl": realized_pnl,
+        "unrealized_pnl": unrealized_pnl,
+        "roi": (realized_pnl + unrealized_pnl) / invested if invested > 0 else None,
+        "position_winrate": wins / len(summaries) if summaries else 0,
+        "unpriced_positions": sum(1 for summary in summaries.values()
+                                  if summary["unpriced_amount"] > 0 or summary["excluded_amount"] > 0),
+    }
+    return summaries, totals
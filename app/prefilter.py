@@ -0,0 +1,193 @@
+import inspect
+import logging
+from typing import NamedTuple, Optional, Tuple
+
+import requests
+
+import core
+import serialization
+from solana_keys import is_on_curve
+
+SYSTEM_PROGRAM = "11111111111111111111111111111111"
+
+# Programs whose accounts hold pool liquidity, and pool authorities that are plain system accounts
+AMM_PROGRAMS = {
+    "675kPX9MHTjS2zt1qfr1NYHuzeLXfQM9H24wFSUt1Mp8",  # Raydium AMM v4
+    "CAMMCzo5YL8w4VFF8KVHrK22GGUsp5VTaW7grrKgrWqK",  # Raydium CLMM
+    "whirLbMiicVdio4qvUfM5KAg6Ct8VwpYzGff3uctyCc",  # Orca Whirlpool
+    "LBUZKhRxPF3XUpBCjp4YzTKgLccjZhTSDM9YuVaPwxo",  # Meteora DLMM
+    "6EF8rrecthR5Dkzon8Nwu78hRvfCKubJ14M5uBEwF6P",  # Pump.fun bonding curves
+}
+POOL_AUTHORITIES = {
+    "5Q544fKrFoe6tsEbD7S8EmxGTJYAKtTVhAW5Q5pge4j1",  # Raydium AMM v4 authority
+}
+
+# getMultipleAccounts accepts at most 100 keys per call
+ACCOUNTS_PER_CALL = 100
+
+logger = logging.getLogger(__name__)
+
+
+class Screening(NamedTuple):
+    owner: str
+    token_accounts: Tuple[str, ...]
+    # "wallet" is analysed, "pool", "program", "bot" and "inactive" are skipped
+    category: str
+    signature_count: int = 0
+    first_activity: Optional[int] = None
+    last_activity: Optional[int] = None
+
+
+def build_accounts_payload(addresses):
+    return {
+        "jsonrpc": "2.0",
+        "id": 1,
+        "method": "getMultipleAccounts",
+        "params": [addresses, {"encoding": "jsonParsed"}]
+    }
+
+
+def get_multiple_accounts(addresses):
+    current_function_name = inspect.currentframe().f_code.co_name
+    accounts = {}
+
+    try:
+        for start in range(0, len(addresses), ACCOUNTS_PER_CALL):
+            chunk = addresses[start:start + ACCOUNTS_PER_CALL]
+            response = core.rpc_client.post(build_accounts_payload(chunk))
+            if response.status_code != 200:
+                return None, f"Error for function {current_function_name}: {response.status_code} - {response.reason}"
+
+            data = serialization.loads(response.content)
+            if "error" in data:
+                return None, f"Error for function {current_function_name}: {data['error']}"
+            accounts.update(zip(chunk, data["result"]["value"]))
+    except (requests.exceptions.RequestException, ValueError) as e:
+        return None, f"Request error for function {current_function_name}: {e}"
+
+    return accounts, None
+
+
+def resolve_owners(token_accounts):
+    # getTokenLargestAccounts returns token accounts, the wallet is the owner stored in the account data
+    accounts, err = get_multiple_accounts(token_accounts)
+    if err is not None:
+        return None, err
+
+    owners = {}
+    for token_account, account in accounts.items():
+        try:
+            owner = account["data"]["parsed"]["info"]["owner"]
+        except (KeyError, TypeError):
+            logger.debug(f"Token account {token_account} could not be resolved, skipping")
+            continue
+        owners.setdefault(owner, []).append(token_account)
+
+    return owners, None
+
+
+def get_signature_samples(owners):
+    # One small page of recent signatures per owner, sent as a single batch, is enough to judge activity
+    current_function_name = inspect.currentframe().f_code.co_name
+    samples = {}
+
+    for start in range(0, len(owners), core.settings.transaction_batch_size):
+        chunk = owners[start:start + core.settings.transaction_batch_size]
+        payload = []
+        for index, owner in enumerate(chunk):
+            request = core.build_signatures_payload(owner, limit=core.settings.prefilter_sample_size)
+            request["id"] = index
+            payload.append(request)
+
+        try:
+            response = core.rpc_client.post(payload)
+            if response.status_code != 200:
+                return None, f"Error for function {current_function_name}: {response.status_code} - {response.reason}"
+            data = serialization.loads(response.content)
+        except (requests.exceptions.RequestException, ValueError) as e:
+            return None, f"Request error for function {current_function_name}: {e}"
+
+        if not isinstance(data, list):
+            return None, f"Error for function {current_function_name}: {data.get('error')}"
+
+        responses_by_id = {entry.get("id"): entry for entry in data if isinstance(entry, dict)}
+        for index, owner in enumerate(chunk):
+            entry = responses_by_id.get(index)
+            if entry is None or "error" in entry:
+                # Unscreened owners are left to the full analysis rather than dropped
+                logger.warning(f"No signature sample for {owner}: {entry.get('error') if entry else 'missing'}")
+                continue
+            samples[owner] = entry["result"]
+
+    return samples, None
+
+
+def daily_rate(signatures):
+    block_times = [tx["blockTime"] for tx in signatures if tx.get("blockTime")]
+    if len(block_times) < 2:
+        return 0.0
+    # Bursts shorter than an hour are spread over the hour, so a handful of quick trades is not a bot
+    span = max(max(block_times) - min(block_times), 3600)
+    return len(block_times) / span * 86400
+
+
+def classify_account(owner, owner_account):
+    # Returns the skip category for accounts that can't be a trader's wallet, None otherwise
+    if owner in POOL_AUTHORITIES:
+        return "pool"
+
+    program = owner_account.get("owner") if owner_account else None
+    if program in AMM_PROGRAMS:
+        return "pool"
+    if not is_on_curve(owner) or (owner_account and owner_account.get("executable")):
+        return "program"
+    if program is not None and program != SYSTEM_PROGRAM:
+        return "program"
+    return None
+
+
+def classify_activity(signatures):
+    if signatures is None:
+        return "wallet"
+    if len(core.filter_signatures(signatures)) < core.settings.prefilter_min_signatures:
+        return "inactive"
+    if daily_rate(signatures) > core.settings.prefilter_max_daily_transactions:
+        return "bot"
+    return "wallet"
+
+
+def screen_wallets(token_accounts):
+    owners, err = resolve_owners(token_accounts)
+    if err is not None:
+        return None, err
+    return screen_owners(owners)
+
+
+def screen_owners(owners):
+    # owners maps each owner wallet to its token accounts
+    owner_addresses = list(owners)
+    owner_accounts, err = get_multiple_accounts(owner_addresses)
+    if err is not None:
+        return None, err
+
+    account_categories = {owner: classify_account(owner, owner_accounts.get(owner)) for owner in owner_addresses}
+
+    # Signatures are only sampled for owners that can still be a trading wallet
+    samples, err = get_signature_samples([owner for owner, category in account_categories.items() if category is None])
+    if err is not None:
+        return None, err
+
+    screenings = []
+    for owner in owner_addresses:
+        signatures = samples.get(owner)
+        block_times = [tx["blockTime"] for tx in signatures or () if tx.get("blockTime")]
+        screenings.append(Screening(
+            owner=owner,
+            token_accounts=tuple(owners[owner]),
+            category=account_categories[owner] or classify_activity(signatures),
+            signature_count=len(signatures or ()),
+            first_activity=min(block_times) if block_times else None,
+            last_activity=max(block_times) if block_times else None,
+        ))
+
+    return screenings, None
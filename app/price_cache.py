@@ -0,0 +1,136 @@
+import collections
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+from sqlite_util import execute_in
+
+BUCKET_SECONDS = 60
+MEMORY_CACHE_SIZE = 50000
+
+default_cache_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'cache', 'prices.sqlite')
+
+# Returned by lookups when nothing is cached, since None is a valid cached price
+MISS = object()
+
+
+class PriceCache:
+    def __init__(self, path=default_cache_path, max_entries=MEMORY_CACHE_SIZE):
+        self.path = path
+        self.max_entries = max_entries
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self._memory = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS prices ("
+            "mint TEXT NOT NULL, bucket INTEGER NOT NULL, price REAL, fetched_at REAL NOT NULL, "
+            "PRIMARY KEY (mint, bucket))"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS spot_prices ("
+            "snapshot TEXT NOT NULL, mint TEXT NOT NULL, price REAL, fetched_at REAL NOT NULL, "
+            "PRIMARY KEY (snapshot, mint))"
+        )
+        self._connection.commit()
+
+    @staticmethod
+    def bucket(timestamp):
+        return int(timestamp) // BUCKET_SECONDS
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, mint, timestamp):
+        key = (mint, self.bucket(timestamp))
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                metrics.record_cache("prices", hits=1)
+                return self._memory[key]
+
+            row = self._connection.execute(
+                "SELECT price FROM prices WHERE mint = ? AND bucket = ?", key
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                metrics.record_cache("prices", misses=1)
+                return MISS
+
+            # Historical buckets never expire
+            self.disk_hits += 1
+            metrics.record_cache("prices", hits=1)
+            self._remember(key, row[0])
+            return row[0]
+
+    def put(self, mint, timestamp, price):
+        key = (mint, self.bucket(timestamp))
+        with self._lock:
+            self._remember(key, price)
+            self._connection.execute(
+                "INSERT OR REPLACE INTO prices (mint, bucket, price, fetched_at) VALUES (?, ?, ?, ?)",
+                (*key, price, time.time())
+            )
+            self._connection.commit()
+
+    def put_many(self, mint, prices):
+        # prices maps a timestamp to its price, written in one transaction
+        rows = {(mint, self.bucket(timestamp)): price for timestamp, price in prices.items()}
+        fetched_at = time.time()
+        with self._lock:
+            for key, price in rows.items():
+                self._remember(key, price)
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO prices (mint, bucket, price, fetched_at) VALUES (?, ?, ?, ?)",
+                [(*key, price, fetched_at) for key, price in rows.items()]
+            )
+            self._connection.commit()
+
+    def get_spot(self, snapshot, mints):
+        # Prices already in the snapshot, None is a valid entry for a mint no source could price
+        with self._lock:
+            found = dict(execute_in(self._connection,
+                                    "SELECT mint, price FROM spot_prices WHERE snapshot = ? AND mint IN ({placeholders})",
+                                    mints, snapshot))
+        metrics.record_cache("spot_prices", len(found), len(set(mints)) - len(found))
+        return found
+
+    def put_spot(self, snapshot, prices):
+        # The first price stored for a mint wins, so wallets analysed concurrently still share one snapshot
+        fetched_at = time.time()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO spot_prices (snapshot, mint, price, fetched_at) VALUES (?, ?, ?, ?)",
+                [(snapshot, mint, price, fetched_at) for mint, price in prices.items()]
+            )
+            self._connection.commit()
+
+    def prune_spot(self, older_than):
+        with self._lock:
+            self._connection.execute("DELETE FROM spot_prices WHERE fetched_at < ?", (older_than,))
+            self._connection.commit()
+
+    def stats(self):
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_ratio": hits / lookups if lookups > 0 else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
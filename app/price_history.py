@@ -0,0 +1,69 @@
+import bisect
+import threading
+
+from price_cache import MISS
+
+# Point lookups accept the first candle within this many seconds of the timestamp
+LOOKUP_WINDOW = 30
+
+
+def plan_price_ranges(timestamps, page_seconds):
+    # Greedily cover every trade with as few fixed-size range calls as possible
+    ranges = []
+    for timestamp in sorted(timestamps):
+        if ranges and timestamp + LOOKUP_WINDOW < ranges[-1][0] + page_seconds:
+            ranges[-1][1] = max(ranges[-1][1], timestamp + LOOKUP_WINDOW)
+        else:
+            ranges.append([timestamp - LOOKUP_WINDOW, timestamp + LOOKUP_WINDOW])
+    return [tuple(time_range) for time_range in ranges]
+
+
+class PriceSeries:
+    def __init__(self):
+        self.ranges = []
+        self.timestamps = []
+        self.values = []
+
+    def add_range(self, time_from, time_to, items):
+        # Ranges are expected in ascending order, as produced by plan_price_ranges
+        self.ranges.append((time_from, time_to))
+        candles = sorted((item["unixTime"], item["value"]) for item in items
+                         if item.get("unixTime") is not None and item.get("value") is not None)
+        for timestamp, value in candles:
+            if self.timestamps and timestamp <= self.timestamps[-1]:
+                continue
+            self.timestamps.append(timestamp)
+            self.values.append(value)
+
+    def covers(self, timestamp):
+        index = bisect.bisect_right(self.ranges, (timestamp - LOOKUP_WINDOW, float("inf"))) - 1
+        return index >= 0 and timestamp + LOOKUP_WINDOW <= self.ranges[index][1]
+
+    def lookup(self, timestamp):
+        if not self.covers(timestamp):
+            return MISS
+
+        index = bisect.bisect_left(self.timestamps, timestamp - LOOKUP_WINDOW)
+        if index < len(self.timestamps) and self.timestamps[index] <= timestamp + LOOKUP_WINDOW:
+            return self.values[index]
+        return None
+
+
+class PriceHistory:
+    def __init__(self):
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def add(self, mint, series):
+        with self._lock:
+            self._series[mint] = series
+
+    def lookup(self, mint, timestamp):
+        series = self._series.get(mint)
+        if series is None:
+            return MISS
+        return series.lookup(timestamp)
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
@@ -0,0 +1,75 @@
+import logging
+import sys
+import time
+
+from tqdm import tqdm
+
+MODES = ("auto", "bar", "log", "none")
+
+logger = logging.getLogger(__name__)
+
+mode = "auto"
+interval = 1.0
+
+
+def configure(new_mode, new_interval):
+    global mode, interval
+    if new_mode not in MODES:
+        raise ValueError(f"Unknown progress mode: {new_mode}")
+    mode = new_mode
+    interval = new_interval
+
+
+class LogProgress:
+    # Headless stand-in for a tqdm bar: a log record at most every interval seconds, and one when done
+    def __init__(self, iterable=None, total=None, desc="", unit="it"):
+        if total is None and hasattr(iterable, "__len__"):
+            total = len(iterable)
+        self.iterable = iterable
+        self.total = total
+        self.desc = desc
+        self.unit = unit
+        self.n = 0
+        self.closed = False
+        self.start = self.last_report = time.monotonic()
+
+    def __iter__(self):
+        for item in self.iterable:
+            yield item
+            self.update(1)
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def update(self, n=1):
+        self.n += n
+        now = time.monotonic()
+        if now - self.last_report >= interval:
+            self.last_report = now
+            self.report(False)
+
+    def report(self, done):
+        count = f"{self.n}/{self.total}" if self.total is not None else str(self.n)
+        logger.info(f"{self.desc}: {count} {self.unit}", extra={
+            "progress": self.desc, "count": self.n, "total": self.total, "done": done,
+            "elapsed": round(time.monotonic() - self.start, 3)})
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.report(True)
+
+
+def progress_bar(iterable=None, total=None, desc="", unit="it"):
+    current_mode = mode
+    if current_mode == "auto":
+        current_mode = "bar" if sys.stderr.isatty() else "log"
+
+    if current_mode == "log":
+        return LogProgress(iterable, total, desc, unit)
+    # Bars redraw at most every interval seconds however fast items complete, a disabled bar costs nothing
+    return tqdm(iterable, total=total, desc=desc, unit=unit, mininterval=interval, disable=current_mode == "none")
@@ -0,0 +1,164 @@
+import asyncio
+import contextlib
+import email.utils
+import json
+import os
+import random
+import threading
+import time
+
+import metrics
+
+try:
+    import fcntl
+
+    def lock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+
+    def unlock_file(f):
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+except ImportError:
+    import msvcrt
+
+    def lock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+    def unlock_file(f):
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+default_state_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'cache', 'ratelimit')
+
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+# After a 429 the rate is multiplied by this, then recovers a little with every success
+THROTTLE_DECREASE = 0.5
+SUCCESS_INCREASE = 0.05
+MIN_RATE_FRACTION = 0.1
+
+
+class MemoryBackend:
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def locked(self, endpoint, initial):
+        with self._lock:
+            state = self._states.setdefault(endpoint, dict(initial))
+            yield state
+
+
+class FileBackend:
+    # One small JSON state file per endpoint, guarded by an OS file lock, shared by every process
+    def __init__(self, directory=default_state_path):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    @contextlib.contextmanager
+    def locked(self, endpoint, initial):
+        path = os.path.join(self.directory, f"{endpoint}.json")
+        descriptor = os.open(path, os.O_RDWR | os.O_CREAT)
+        with os.fdopen(descriptor, "r+") as f:
+            lock_file(f)
+            try:
+                f.seek(0)
+                content = f.read()
+                try:
+                    state = json.loads(content) if content else dict(initial)
+                except ValueError:
+                    state = dict(initial)
+
+                yield state
+
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+            finally:
+                unlock_file(f)
+
+
+def parse_retry_after(value):
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def backoff_delay(attempt, retry_after=None):
+    if retry_after is not None:
+        return retry_after
+    # Exponential backoff with full jitter
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+
+class RateLimiter:
+    def __init__(self, budgets, backend=None):
+        # budgets maps an endpoint name to (calls, period in seconds)
+        self.budgets = budgets
+        self.backend = backend if backend is not None else FileBackend()
+
+    def _initial_state(self, endpoint):
+        calls, period = self.budgets[endpoint]
+        return {"tokens": calls, "updated": time.time(), "rate": calls / period, "blocked_until": 0.0}
+
+    def reserve(self, endpoint):
+        calls, period = self.budgets[endpoint]
+        with self.backend.locked(endpoint, self._initial_state(endpoint)) as state:
+            now = time.time()
+            state["rate"] = min(state["rate"], calls / period)
+            tokens = min(calls, state["tokens"] + (now - state["updated"]) * state["rate"])
+
+            # Tokens may go negative, each waiting caller then owns a slot further in the future
+            tokens -= 1
+            state["tokens"] = tokens
+            state["updated"] = now
+
+            wait = -tokens / state["rate"] if tokens < 0 else 0.0
+            return max(wait, state["blocked_until"] - now)
+
+    def acquire(self, endpoint):
+        wait = self.reserve(endpoint)
+        metrics.record_wait(endpoint, wait)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, endpoint):
+        wait = await asyncio.to_thread(self.reserve, endpoint)
+        metrics.record_wait(endpoint, wait)
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def record_success(self, endpoint):
+        calls, period = self.budgets[endpoint]
+        base_rate = calls / period
+        with self.backend.locked(endpoint, self._initial_state(endpoint)) as state:
+            if state["rate"] < base_rate:
+                state["rate"] = min(base_rate, state["rate"] + base_rate * SUCCESS_INCREASE)
+
+    def record_throttle(self, endpoint, retry_after=None, attempt=0):
+        calls, period = self.budgets[endpoint]
+        base_rate = calls / period
+        delay = backoff_delay(attempt, parse_retry_after(retry_after))
+
+        with self.backend.locked(endpoint, self._initial_state(endpoint)) as state:
+            now = time.time()
+            state["rate"] = max(base_rate * MIN_RATE_FRACTION, state["rate"] * THROTTLE_DECREASE)
+            state["blocked_until"] = max(state["blocked_until"], now + delay)
+            # Drop any burst credit so callers resume at the reduced rate
+            state["tokens"] = min(state["tokens"], 0.0)
+            state["updated"] = now
+
+        return delay
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import threading
+import time
+
+import metrics
+import serialization
+from sqlite_util import execute_in
+from tx_parser import Trade
+
+# A claim older than this is taken over, the worker holding it is assumed to be gone
+CLAIM_TIMEOUT = 120
+
+
+class RunCache:
+    # Shared by the wallet workers of one multi-wallet run: which transactions are being fetched right now,
+    # and the trades parsed from each transaction for every wallet of the run
+    def __init__(self, path, owners=None):
+        self.path = path
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS owners (owner TEXT PRIMARY KEY)")
+        self._connection.execute("CREATE TABLE IF NOT EXISTS parsed (signature TEXT PRIMARY KEY)")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS owner_trades ("
+            "signature TEXT NOT NULL, owner TEXT NOT NULL, trades BLOB NOT NULL, minted BLOB NOT NULL, "
+            "PRIMARY KEY (signature, owner))"
+        )
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS claims ("
+            "signature TEXT PRIMARY KEY, claimant TEXT NOT NULL, claimed_at REAL NOT NULL)"
+        )
+        if owners is not None:
+            self._connection.executemany("INSERT OR IGNORE INTO owners (owner) VALUES (?)",
+                                         [(owner,) for owner in owners])
+        self._connection.commit()
+
+        self.owners = frozenset(row[0] for row in self._connection.execute("SELECT owner FROM owners"))
+
+    def get_parsed(self, signatures, owner):
+        # Transactions already parsed by any worker, with the owner's trades and minted tokens (empty if none)
+        with self._lock:
+            rows = execute_in(
+                self._connection,
+                "SELECT parsed.signature, owner_trades.trades, owner_trades.minted FROM parsed "
+                "LEFT JOIN owner_trades ON owner_trades.signature = parsed.signature AND owner_trades.owner = ? "
+                "WHERE parsed.signature IN ({placeholders})", signatures, owner)
+        metrics.record_cache("shared_trades", len(rows), len(set(signatures)) - len(rows))
+
+        parsed = {}
+        for signature, trades, minted in rows:
+            if trades is None:
+                parsed[signature] = ([], [])
+            else:
+                parsed[signature] = ([Trade(*trade) for trade in serialization.loads(trades)], serialization.loads(minted))
+        return parsed
+
+    def put_parsed(self, results):
+        # results maps a signature to {owner: (trades, minted)}, owners without trades are left out.
+        # The trades and the parsed marker are committed together, readers never see half a transaction.
+        rows = [(signature, owner, serialization.dumps([list(trade) for trade in trades]), serialization.dumps(minted))
+                for signature, owners in results.items() for owner, (trades, minted) in owners.items()]
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO owner_trades (signature, owner, trades, minted) VALUES (?, ?, ?, ?)", rows)
+            self._connection.executemany("INSERT OR IGNORE INTO parsed (signature) VALUES (?)",
+                                         [(signature,) for signature in results])
+            self._connection.commit()
+
+    def claim(self, signatures, claimant):
+        # Returns the signatures the claimant now owns, the rest is being fetched by another worker
+        now = time.time()
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO claims (signature, claimant, claimed_at) VALUES (?, ?, ?)",
+                [(signature, claimant, now) for signature in signatures])
+            self._connection.executemany(
+                "UPDATE claims SET claimant = ?, claimed_at = ? WHERE signature = ? AND claimed_at < ?",
+                [(claimant, now, signature, now - CLAIM_TIMEOUT) for signature in signatures])
+            self._connection.commit()
+            rows = execute_in(self._connection,
+                              "SELECT signature FROM claims WHERE claimant = ? AND signature IN ({placeholders})",
+                              signatures, claimant)
+        return {row[0] for row in rows}
+
+    def release(self, signatures, claimant):
+        # Lets waiting workers fetch the signatures themselves after this claimant failed them
+        with self._lock:
+            execute_in(self._connection, "DELETE FROM claims WHERE claimant = ? AND signature IN ({placeholders})",
+                       signatures, claimant)
+            self._connection.commit()
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def discard(self):
+        # Called by the process that created the run once every worker has exited
+        self.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.exists(self.path + suffix):
+                os.remove(self.path + suffix)
@@ -0,0 +1,98 @@
+import dataclasses
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+import core
+import logging_config
+import metrics
+import pipeline
+import progress
+from run_cache import RunCache
+
+logger = logging.getLogger(__name__)
+
+
+def init_worker(settings, spot_snapshot, run_cache_path):
+    # Bars from several workers would overwrite each other and the run's own bar, workers log their progress
+    if settings.progress in ("auto", "bar"):
+        settings = dataclasses.replace(settings, progress="log")
+    logging_config.setup_logging(settings.log_level)
+    core.configure(settings)
+    # Every wallet in the run is valued against the parent's current price snapshot
+    core.use_spot_snapshot(spot_snapshot)
+    pipeline.use_run_cache(run_cache_path)
+
+
+def analyse_wallet(analyse, wallet_address, save_type):
+    # Failures are returned instead of raised so one wallet never aborts the run
+    # Metrics are per wallet, the parent process merges them
+    metrics.reset()
+    try:
+        return wallet_address, analyse(wallet_address, save_type), None, metrics.snapshot()
+    except Exception as e:
+        logger.error(f"Wallet {wallet_address} failed: {e}", exc_info=True)
+        return wallet_address, None, f"{type(e).__name__}: {e}", metrics.snapshot()
+
+
+def run_wallets(wallet_addresses, analyse, save_type, workers=None, on_result=None):
+    # Workers share the rate limit budgets through the limiter's file backend
+    # on_result is called in this process as each wallet finishes, e.g. to journal progress
+    summaries = []
+    failures = {}
+    workers = workers or core.settings.wallet_workers
+
+    # Transactions shared by wallets of the run are fetched and parsed once, for all of them
+    run_cache_path = os.path.join(core.settings.data_dir, 'cache', 'runs', f"{time.time_ns()}-{os.getpid()}.sqlite")
+    run_cache = RunCache(run_cache_path, wallet_addresses)
+
+    # Workers are configured with this process' settings, including any CLI overrides
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(core.settings, core.get_spot_snapshot(), run_cache_path)) as executor:
+            futures = [executor.submit(analyse_wallet, analyse, wallet_address, save_type)
+                       for wallet_address in wallet_addresses]
+
+            try:
+                collect_results(futures, summaries, failures, on_result)
+            except KeyboardInterrupt:
+                # Queued wallets are dropped, only those already running are waited for, they stay pending in a journal
+                executor.shutdown(cancel_futures=True)
+                raise
+    finally:
+        run_cache.discard()
+
+    return summaries, failures
+
+
+def collect_results(futures, summaries, failures, on_result):
+    with progress.progress_bar(total=len(futures), desc="Calculating performance for top wallets") as pbar:
+        for future in as_completed(futures):
+            wallet_address, summary, err, wallet_metrics = future.result()
+            metrics.merge(wallet_metrics)
+            if on_result is not None:
+                on_result(wallet_address, summary, err)
+            if err is not None:
+                failures[wallet_address] = err
+                print(f"{wallet_address} failed: {err}")
+            elif summary is None:
+                print(f"{wallet_address} skipped")
+            else:
+                summaries.append(summary)
+                print(f"{wallet_address} done")
+            pbar.update(1)
+
+
+def save_leaderboard(summaries, path, filename):
+    os.makedirs(path, exist_ok=True)
+    df = pd.DataFrame(summaries, columns=["wallet", "pnl", "current_value", "win_rate", "unique_tokens_traded",
+                                          "realized_pnl", "unrealized_pnl", "roi"])
+    df = df.sort_values(by=["pnl", "win_rate"], ascending=False).reset_index(drop=True)
+    df.insert(0, "rank", range(1, len(df) + 1))
+
+    csv_path = os.path.join(path, filename + ".csv")
+    df.to_csv(csv_path, index=False)
+    print(f"Leaderboard saved as {csv_path}")
+    return csv_path
@@ -0,0 +1,87 @@
+import json
+from typing import Any, List, Optional, TypedDict, Union
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+if orjson is not None:
+    BACKEND = "orjson"
+elif msgspec is not None:
+    BACKEND = "msgspec"
+else:
+    BACKEND = "json"
+
+
+class RpcError(TypedDict, total=False):
+    code: int
+    message: str
+    data: Any
+
+
+class SignatureInfo(TypedDict):
+    signature: str
+    slot: int
+    err: Any
+    memo: Optional[str]
+    blockTime: Optional[int]
+    confirmationStatus: Optional[str]
+
+
+class SignaturesResponse(TypedDict, total=False):
+    jsonrpc: str
+    id: int
+    result: List[SignatureInfo]
+    error: RpcError
+
+
+class TransactionResponse(TypedDict, total=False):
+    jsonrpc: str
+    id: int
+    # Kept untyped so the raw transaction store receives the complete payload
+    result: Any
+    error: RpcError
+
+
+# A batch answer is a list, but RPC nodes answer a rejected batch with a single error object
+TransactionBatchResponse = Union[List[TransactionResponse], TransactionResponse]
+
+_decoders = {}
+
+
+def loads(data):
+    if orjson is not None:
+        return orjson.loads(data)
+    if msgspec is not None:
+        return msgspec.json.decode(data)
+    return json.loads(data)
+
+
+def decode(data, shape=None):
+    # Typed decoding validates the response shape and drops fields the app never reads
+    if msgspec is not None and shape is not None:
+        decoder = _decoders.get(shape)
+        if decoder is None:
+            decoder = _decoders[shape] = msgspec.json.Decoder(shape)
+        try:
+            return decoder.decode(data)
+        except msgspec.ValidationError:
+            pass
+    return loads(data)
+
+
+def dumps(data, pretty=False):
+    if orjson is not None:
+        option = orjson.OPT_SERIALIZE_NUMPY | (orjson.OPT_INDENT_2 if pretty else 0)
+        return orjson.dumps(data, option=option)
+    if msgspec is not None and not pretty:
+        return msgspec.json.encode(data)
+    if pretty:
+        return json.dumps(data, indent=4).encode()
+    return json.dumps(data, separators=(',', ':')).encode()
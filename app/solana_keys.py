@@ -0,0 +1,47 @@
+BASE58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+BASE58_INDEX = {char: index for index, char in enumerate(BASE58_ALPHABET)}
+
+# ed25519 curve parameters
+FIELD_PRIME = 2 ** 255 - 19
+CURVE_D = -121665 * pow(121666, FIELD_PRIME - 2, FIELD_PRIME) % FIELD_PRIME
+
+
+def b58decode(value):
+    number = 0
+    for char in value:
+        if char not in BASE58_INDEX:
+            raise ValueError(f"Invalid base58 character: {char!r}")
+        number = number * 58 + BASE58_INDEX[char]
+
+    leading_zeros = len(value) - len(value.lstrip("1"))
+    body = number.to_bytes((number.bit_length() + 7) // 8, "big")
+    return b"\x00" * leading_zeros + body
+
+
+def b58encode(data):
+    number = int.from_bytes(data, "big")
+    chars = []
+    while number:
+        number, remainder = divmod(number, 58)
+        chars.append(BASE58_ALPHABET[remainder])
+
+    leading_zeros = len(data) - len(data.lstrip(b"\x00"))
+    return "1" * leading_zeros + "".join(reversed(chars))
+
+
+def is_on_curve(address):
+    # Wallet keys are ed25519 points, program derived addresses are deliberately off the curve
+    key = b58decode(address)
+    if len(key) != 32:
+        return False
+
+    y = int.from_bytes(key, "little") & ((1 << 255) - 1)
+    if y >= FIELD_PRIME:
+        return False
+
+    y2 = y * y % FIELD_PRIME
+    x2 = (y2 - 1) * pow(CURVE_D * y2 + 1, FIELD_PRIME - 2, FIELD_PRIME) % FIELD_PRIME
+    if x2 == 0:
+        return not key[31] & 0x80
+    # x exists only if x^2 is a quadratic residue
+    return pow(x2, (FIELD_PRIME - 1) // 2, FIELD_PRIME) == 1
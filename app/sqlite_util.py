@@ -0,0 +1,13 @@
+# SQLite caps the number of bound parameters per statement
+QUERY_CHUNK_SIZE = 500
+
+
+def execute_in(connection, query, values, *params):
+    # Runs query once per chunk of values, its {placeholders} slot becomes the chunk's IN list.
+    # params are bound ahead of the chunk, the rows of every chunk are returned together.
+    rows = []
+    for start in range(0, len(values), QUERY_CHUNK_SIZE):
+        chunk = values[start:start + QUERY_CHUNK_SIZE]
+        placeholders = ",".join("?" * len(chunk))
+        rows.extend(connection.execute(query.format(placeholders=placeholders), (*params, *chunk)).fetchall())
+    return rows
@@ -0,0 +1,103 @@
+from typing import NamedTuple
+
+
+class Trade(NamedTuple):
+    token: str
+    side: str
+    pre_amount: float
+    post_amount: float
+    amount: float
+    timestamp: int
+
+
+def owner_balances(balances, wallet_address):
+    return {balance['accountIndex']: balance for balance in balances if balance.get('owner') == wallet_address}
+
+
+def parse_minted_tokens(meta, wallet_address):
+    minted_tokens = []
+    for inner_instruction in meta.get('innerInstructions') or ():
+        for instruction in inner_instruction.get('instructions') or ():
+            parsed = instruction.get('parsed')
+            if not isinstance(parsed, dict):
+                continue
+            info = parsed.get('info')
+            if info and info.get('authority') == wallet_address and 'mint' in info and 'tokenAmount' in info:
+                minted_tokens.append(info['mint'])
+    return minted_tokens
+
+
+def parse_transaction(transaction, wallet_address):
+    # Pure parsing, no I/O: returns the wallet's trades and the tokens it minted in this transaction
+    meta = transaction.get('meta')
+    if not meta:
+        return [], []
+
+    pre_token_balances = meta.get('preTokenBalances') or ()
+    post_token_balances = meta.get('postTokenBalances') or ()
+
+    # Fast path, most transactions a wallet signs or appears in don't move its token balances
+    pre_balances = owner_balances(pre_token_balances, wallet_address)
+    post_balances = owner_balances(post_token_balances, wallet_address)
+    if not pre_balances and not post_balances:
+        return [], []
+
+    # An account only has to belong to the wallet on one side, the other side is still needed for the amount
+    for balance in pre_token_balances:
+        if balance['accountIndex'] in post_balances:
+            pre_balances.setdefault(balance['accountIndex'], balance)
+    for balance in post_token_balances:
+        if balance['accountIndex'] in pre_balances:
+            post_balances.setdefault(balance['accountIndex'], balance)
+
+    block_time = transaction['blockTime']
+    trades = []
+
+    for index in sorted(pre_balances.keys() | post_balances.keys()):
+        pre_balance = pre_balances.get(index)
+        post_balance = post_balances.get(index)
+
+        pre_amount = 0.0
+        post_amount = 0.0
+        token = ""
+
+        post_ui_amount = post_balance['uiTokenAmount']['uiAmount'] if post_balance and post_balance.get('uiTokenAmount') else None
+        if post_ui_amount is not None:
+            post_amount = float(post_ui_amount)
+            token = post_balance['mint']
+
+        pre_ui_amount = pre_balance['uiTokenAmount']['uiAmount'] if pre_balance and pre_balance.get('uiTokenAmount') else None
+        if pre_ui_amount is not None:
+            pre_amount = float(pre_ui_amount)
+            token = pre_balance['mint']
+
+        side = "buy" if post_amount > pre_amount else "sell"
+        trades.append(Trade(token, side, pre_amount, post_amount, abs(pre_amount - post_amount), block_time))
+
+    return trades, parse_minted_tokens(meta, wallet_address)
+
+
+def transaction_owners(meta):
+    # Every wallet parse_transaction could return trades or minted tokens for
+    owners = {balance.get('owner') for balance in meta.get('preTokenBalances') or ()}
+    owners.update(balance.get('owner') for balance in meta.get('postTokenBalances') or ())
+    for inner_instruction in meta.get('innerInstructions') or ():
+        for instruction in inner_instruction.get('instructions') or ():
+            parsed = instruction.get('parsed')
+            if isinstance(parsed, dict) and parsed.get('info'):
+                owners.add(parsed['info'].get('authority'))
+    return owners
+
+
+def parse_transaction_owners(transaction, owners):
+    # One decoded transaction, the trades of every wallet in owners that it touches
+    meta = transaction.get('meta')
+    if not meta:
+        return {}
+
+    results = {}
+    for owner in transaction_owners(meta) & owners:
+        trades, minted = parse_transaction(transaction, owner)
+        if trades or minted:
+            results[owner] = (trades, minted)
+    return results
@@ -0,0 +1,102 @@
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+import metrics
+import serialization
+from sqlite_util import execute_in
+
+default_store_path = os.path.join(os.path.dirname(__file__), '..', 'data', 'cache', 'transactions.sqlite')
+
+COMPRESSION_LEVEL = 9
+
+
+def compress(data):
+    if zstandard is not None:
+        return "zstd", zstandard.ZstdCompressor(level=COMPRESSION_LEVEL).compress(data)
+    return "zlib", zlib.compress(data, COMPRESSION_LEVEL)
+
+
+def decompress(codec, blob):
+    if codec == "zstd":
+        if zstandard is None:
+            raise RuntimeError("Transaction was stored with zstd but the zstandard package is not installed")
+        return zstandard.ZstdDecompressor().decompress(blob)
+    return zlib.decompress(blob)
+
+
+class TransactionStore:
+    # Raw getTransaction results keyed by signature, which already identifies the transaction content
+    def __init__(self, path=default_store_path):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS transactions ("
+            "signature TEXT PRIMARY KEY, codec TEXT NOT NULL, payload BLOB NOT NULL, stored_at REAL NOT NULL)"
+        )
+        self._connection.commit()
+
+    @staticmethod
+    def encode(transaction):
+        return compress(serialization.dumps(transaction))
+
+    @staticmethod
+    def decode(codec, blob):
+        return serialization.loads(decompress(codec, blob))
+
+    def get(self, signature):
+        return self.get_many([signature]).get(signature)
+
+    def get_many(self, signatures):
+        with self._lock:
+            rows = execute_in(self._connection,
+                              "SELECT signature, codec, payload FROM transactions WHERE signature IN ({placeholders})",
+                              signatures)
+
+            self.hits += len(rows)
+            self.misses += len(set(signatures)) - len(rows)
+        metrics.record_cache("transactions", len(rows), len(set(signatures)) - len(rows))
+
+        return {signature: self.decode(codec, blob) for signature, codec, blob in rows}
+
+    def put(self, signature, transaction):
+        self.put_many({signature: transaction})
+
+    def put_many(self, transactions):
+        # Missing transactions (null results) are not stored, they may still show up later
+        now = time.time()
+        rows = [(signature, *self.encode(transaction), now)
+                for signature, transaction in transactions.items() if transaction is not None]
+        if not rows:
+            return
+
+        with self._lock:
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO transactions (signature, codec, payload, stored_at) VALUES (?, ?, ?, ?)", rows
+            )
+            self._connection.commit()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups > 0 else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
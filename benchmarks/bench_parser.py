@@ -0,0 +1,52 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import tx_parser  # noqa: E402
+
+fixtures_path = os.path.join(os.path.dirname(__file__), 'fixtures', 'transactions.json')
+
+
+def load_fixtures(path=fixtures_path):
+    with open(path) as f:
+        fixtures = json.load(f)
+    return fixtures["wallet"], fixtures["transactions"]
+
+
+def run(transactions, wallet_address, count):
+    trades = 0
+    fast_path = 0
+    start = time.perf_counter()
+    for index in range(count):
+        parsed, _ = tx_parser.parse_transaction(transactions[index % len(transactions)], wallet_address)
+        trades += len(parsed)
+        fast_path += not parsed
+    return time.perf_counter() - start, trades, fast_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parser throughput on recorded getTransaction fixtures")
+    parser.add_argument("--count", type=int, default=200000, help="Transactions to parse per round")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--fixtures", default=fixtures_path)
+    args = parser.parse_args()
+
+    wallet_address, transactions = load_fixtures(args.fixtures)
+    run(transactions, wallet_address, len(transactions))  # warm up
+
+    timings = []
+    for _ in range(args.rounds):
+        elapsed, trades, fast_path = run(transactions, wallet_address, args.count)
+        timings.append(elapsed)
+
+    best = min(timings)
+    print(f"fixtures: {len(transactions)} transactions, {trades} trades and {fast_path} without trades per round")
+    print(f"best of {args.rounds}: {args.count / best:,.0f} txn/s ({best * 1e6 / args.count:.2f} us/txn)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+import synthetic
+from mock_server import MockServer
+from synthetic import SyntheticToken, SyntheticWallet
+
+# Flows and sizes run by --suite, each in a fresh process so peak RSS is per run
+SUITE = [("wallet", "100"), ("wallet", "10k"), ("wallet", "100k"), ("top", "100"), ("top", "10k")]
+
+
+def peak_rss_mib(who):
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return resource.getrusage(who).ru_maxrss / scale
+
+
+def configure(url, data_dir, rate):
+    import config
+    import core
+
+    core.configure(config.load_settings(overrides={
+        "rpc_url": url,
+        "birdeye_url": url,
+        "dexscreener_url": url,
+        "birdeye_api_key": "benchmark",
+        "data_dir": data_dir,
+        "rpc_calls": rate,
+        "rpc_period": 1,
+        "birdeye_calls": rate,
+        "birdeye_period": 1,
+        "dexscreener_calls": rate,
+        "dexscreener_period": 1,
+    }))
+
+
+def run_wallet(size):
+    import main
+
+    wallet = SyntheticWallet("bench", size)
+    summary = main.calculate_wallet_performance(wallet.address, "benchmark")
+    return {"wallets": 1, "failures": 0 if summary is not None else 1}
+
+
+def run_top(size, holders):
+    import main
+    import runner
+
+    token = SyntheticToken("bench", holders, size)
+    wallets = main.get_top_performers(token.mint)
+    summaries, failures = runner.run_wallets(wallets, main.calculate_wallet_performance, "benchmark")
+    return {"wallets": len(wallets), "failures": len(failures)}
+
+
+def run(args):
+    size = synthetic.SIZES.get(args.size) or int(args.size)
+    server_wallets = [("bench", size)] if args.flow == "wallet" else []
+    server_tokens = [("bench", args.holders, size)] if args.flow == "top" else []
+    data_dir = tempfile.mkdtemp(prefix="walko-bench-")
+    # main logs to ./logs, keep that out of the working tree too
+    os.chdir(data_dir)
+
+    try:
+        with MockServer(server_wallets, server_tokens, args.latency, args.throttle_rate) as server:
+            configure(server.url, data_dir, args.rate)
+            import metrics
+
+            start = time.perf_counter()
+            outcome = run_wallet(size) if args.flow == "wallet" else run_top(size, args.holders)
+            elapsed = time.perf_counter() - start
+
+            with urllib.request.urlopen(server.url + "__stats") as response:
+                server_stats = json.load(response)
+            client_requests = {endpoint: entry["count"] for endpoint, entry in metrics.report()["requests"].items()}
+            # Workers have exited by now, the mock server has not, so children only covers wallet workers
+            peak_rss = peak_rss_mib(resource.RUSAGE_SELF) if resource else None
+            worker_rss = peak_rss_mib(resource.RUSAGE_CHILDREN) if resource else None
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    return {
+        "flow": args.flow,
+        "size": size,
+        "holders": args.holders if args.flow == "top" else None,
+        "latency": args.latency,
+        "throttle_rate": args.throttle_rate,
+        "wall_seconds": elapsed,
+        "client_requests": client_requests,
+        "server_calls": server_stats["calls"],
+        "server_requests": server_stats["requests"],
+        "throttled": server_stats["throttled"],
+        "server_methods": server_stats["methods"],
+        "peak_rss_mib": peak_rss,
+        "worker_peak_rss_mib": worker_rss,
+        **outcome,
+    }
+
+
+def print_result(result):
+    requests = sum(result["client_requests"].values())
+    rss = f"{result['peak_rss_mib']:.0f} MiB" if result["peak_rss_mib"] is not None else "n/a"
+    if result["flow"] == "top" and result["worker_peak_rss_mib"]:
+        rss += f" (workers {result['worker_peak_rss_mib']:.0f} MiB)"
+    print(f"{result['flow']:<7} {result['size']:>7} txn  {result['wall_seconds']:>9.2f}s  "
+          f"{requests:>7} requests ({result['server_calls']} calls, {result['throttled']} throttled)  peak RSS {rss}")
+
+
+def run_suite(args):
+    results = []
+    for flow, size in SUITE:
+        command = [sys.executable, os.path.abspath(__file__), "--flow", flow, "--size", size, "--json",
+                   "--latency", str(args.latency), "--throttle-rate", str(args.throttle_rate),
+                   "--holders", str(args.holders), "--rate", str(args.rate)]
+        completed = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        if completed.returncode != 0:
+            print(f"{flow} {size}: failed with exit code {completed.returncode}")
+            continue
+        result = json.loads(completed.stdout.strip().splitlines()[-1])
+        results.append(result)
+        print_result(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end wallet analysis against the local mock APIs")
+    parser.add_argument("--flow", choices=("wallet", "top"), default="wallet",
+                        help="calculate_wallet_performance for one wallet, or the top performers flow for a token")
+    parser.add_argument("--size", default="10k", help="Transactions per wallet: 100, 10k, 100k or a number")
+    parser.add_argument("--holders", type=int, default=5, help="Wallets holding the token in the top flow")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds the mock adds to every response")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--rate", type=int, default=1000, help="Client rate limit per endpoint, calls per second")
+    parser.add_argument("--json", action="store_true", help="Print the result as a JSON line")
+    parser.add_argument("--suite", action="store_true", help="Run every flow and size in SUITE")
+    args = parser.parse_args()
+
+    if args.suite:
+        run_suite(args)
+        return
+
+    result = run(args)
+    if args.json:
+        print(json.dumps(result))
+    else:
+        print_result(result)
+
+
+if __name__ == "__main__":
+    main()
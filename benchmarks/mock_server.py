@@ -0,0 +1,302 @@
+import argparse
+import base64
+import multiprocessing
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import synthetic
+from synthetic import SyntheticToken, SyntheticWallet
+
+# synthetic puts app/ on the path
+import serialization  # noqa: E402
+from solana_keys import b58decode  # noqa: E402
+
+TOKEN_PROGRAM = "TokenkegQfeZyiNwAJbNbGKPFXCWuBvf9Ss623VQ5DA"
+SYSTEM_PROGRAM = "11111111111111111111111111111111"
+TOKEN_ACCOUNT_SIZE = 165
+PRICE_HISTORY_LIMIT = 1000
+
+
+class MockState:
+    def __init__(self, wallets=(), tokens=(), latency=0.0, throttle_rate=0.0, retry_after=1, error_rate=0.0, seed=0):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "calls": 0, "throttled": 0, "errors": 0, "bytes_sent": 0, "methods": {}}
+
+        self.tokens = {token.mint: token for token in tokens}
+        self.wallets = {}
+        self.token_accounts = {}
+        for wallet in list(wallets) + [wallet for token in tokens for wallet in token.wallets]:
+            self.wallets[wallet.address] = wallet
+        for token in tokens:
+            for token_account, owner in token.token_accounts.items():
+                self.token_accounts[token_account] = (owner, token.mint)
+        self.wallets_by_prefix = {wallet.signature_prefix: wallet for wallet in self.wallets.values()}
+
+    def count(self, methods):
+        with self.lock:
+            self.stats["requests"] += 1
+            for method in methods:
+                self.stats["calls"] += 1
+                self.stats["methods"][method] = self.stats["methods"].get(method, 0) + 1
+
+    def throttled(self):
+        with self.lock:
+            if self.throttle_rate and self.random.random() < self.throttle_rate:
+                self.stats["throttled"] += 1
+                return True
+        return False
+
+    def failed(self):
+        with self.lock:
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return True
+        return False
+
+    def get_signatures(self, address, options=None):
+        options = options or {}
+        wallet = self.wallets.get(address)
+        if wallet is None:
+            return []
+        return wallet.signatures(options.get("before"), options.get("until"), options.get("limit", 1000))
+
+    def get_transaction(self, signature, options=None):
+        prefix, index = SyntheticWallet.split_signature(signature)
+        wallet = self.wallets_by_prefix.get(prefix)
+        return wallet.transaction(index) if wallet is not None else None
+
+    def token_balances(self, mint):
+        # Holders' raw balances, in token account order, largest first
+        token = self.tokens.get(mint)
+        accounts = list(token.token_accounts) if token is not None else []
+        return [(account, 1000 - index) for index, account in enumerate(accounts)]
+
+    def get_token_largest_accounts(self, mint, options=None):
+        return {"context": {"slot": synthetic.START_SLOT}, "value": [
+            {"address": account, "amount": str(amount), "decimals": 6, "uiAmount": amount / 1e6,
+             "uiAmountString": str(amount / 1e6)} for account, amount in self.token_balances(mint)]}
+
+    def get_program_accounts(self, program, options=None):
+        # Only what the holder scan sends: classic token accounts filtered by mint and owner prefix
+        options = options or {}
+        if program != TOKEN_PROGRAM:
+            return []
+        memcmp = [(f["memcmp"]["offset"], b58decode(f["memcmp"]["bytes"])) for f in options.get("filters", [])
+                  if "memcmp" in f]
+        data_slice = options.get("dataSlice") or {"offset": 0, "length": TOKEN_ACCOUNT_SIZE}
+
+        accounts = []
+        for mint in self.tokens:
+            for account, amount in self.token_balances(mint):
+                owner = self.token_accounts[account][0]
+                data = (b58decode(mint) + b58decode(owner) + amount.to_bytes(8, "little")).ljust(TOKEN_ACCOUNT_SIZE, b"\0")
+                if any(data[offset:offset + len(value)] != value for offset, value in memcmp):
+                    continue
+                sliced = data[data_slice["offset"]:data_slice["offset"] + data_slice["length"]]
+                accounts.append({"pubkey": account, "account": {
+                    "owner": TOKEN_PROGRAM, "executable": False, "lamports": 2039280, "space": TOKEN_ACCOUNT_SIZE,
+                    "data": [base64.b64encode(sliced).decode(), "base64"]}})
+        return accounts
+
+    def get_account(self, address):
+        if address in self.token_accounts:
+            owner, mint = self.token_accounts[address]
+            return {"owner": TOKEN_PROGRAM, "executable": False, "lamports": 2039280, "data": {
+                "program": "spl-token", "space": 165,
+                "parsed": {"type": "account", "info": {"owner": owner, "mint": mint, "state": "initialized"}}}}
+        if address in self.tokens:
+            return {"owner": TOKEN_PROGRAM, "executable": False, "lamports": 1461600, "data": {
+                "program": "spl-token", "space": 82,
+                "parsed": {"type": "mint", "info": {"decimals": 6, "isInitialized": True, "supply": "1000000"}}}}
+        if address in self.wallets or address == synthetic.POOL_AUTHORITY:
+            return {"owner": SYSTEM_PROGRAM, "executable": False, "lamports": 1_000_000_000, "data": ["", "base64"]}
+        return None
+
+    def get_multiple_accounts(self, addresses, options=None):
+        return {"context": {"slot": synthetic.START_SLOT}, "value": [self.get_account(address) for address in addresses]}
+
+    def rpc(self, body):
+        # JSON-RPC batches are answered as a list, in request order
+        if isinstance(body, list):
+            self.count([request.get("method") for request in body])
+            return [self.call(request) for request in body]
+        self.count([body.get("method")])
+        return self.call(body)
+
+    def call(self, request):
+        methods = {
+            "getSignaturesForAddress": self.get_signatures,
+            "getTransaction": self.get_transaction,
+            "getTokenLargestAccounts": self.get_token_largest_accounts,
+            "getMultipleAccounts": self.get_multiple_accounts,
+            "getProgramAccounts": self.get_program_accounts,
+        }
+        method = methods.get(request.get("method"))
+        if method is None:
+            return {"jsonrpc": "2.0", "id": request.get("id"),
+                    "error": {"code": -32601, "message": "Method not found"}}
+        return {"jsonrpc": "2.0", "id": request.get("id"), "result": method(*request.get("params", []))}
+
+    def price_history(self, query):
+        self.count(["history_price"])
+        mint = query["address"][0]
+        time_from = int(query["time_from"][0])
+        time_to = int(query["time_to"][0])
+        first = -(-time_from // 60) * 60
+        items = [{"unixTime": timestamp, "value": synthetic.price(mint, timestamp), "address": mint}
+                 for timestamp in range(first, time_to + 1, 60)][:PRICE_HISTORY_LIMIT]
+        return {"success": True, "data": {"items": items}}
+
+    def multi_price(self, query):
+        self.count(["multi_price"])
+        now = time.time()
+        mints = query["list_address"][0].split(",")
+        return {"success": True, "data": {mint: {"value": synthetic.price(mint, now), "updateUnixTime": int(now)}
+                                          for mint in mints}}
+
+    def pair(self, mint):
+        return {
+            "chainId": "solana",
+            "dexId": "raydium",
+            "url": f"https://dexscreener.com/solana/{mint}",
+            "pairAddress": mint,
+            "baseToken": {"address": mint, "name": "Synthetic", "symbol": "SYN"},
+            "quoteToken": {"address": "So11111111111111111111111111111111111111112", "name": "Wrapped SOL",
+                           "symbol": "SOL"},
+            "priceUsd": str(synthetic.price(mint, time.time())),
+            "liquidity": {"usd": 100000.0},
+        }
+
+    def dex_tokens(self, mints):
+        self.count(["dex_tokens"])
+        return {"pairs": [self.pair(mint) for mint in mints.split(",")]}
+
+    def search(self, query):
+        self.count(["dex_search"])
+        return {"pairs": [self.pair(query["q"][0])]}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are separate writes, Nagle would stall every keep-alive response on a delayed ACK
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def respond(self, status, data, headers=None):
+        body = serialization.dumps(data)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+        with self.state.lock:
+            self.state.stats["bytes_sent"] += len(body)
+
+    def handle_request(self, handler):
+        if self.state.latency:
+            time.sleep(self.state.latency)
+        if self.state.throttled():
+            self.respond(429, {"message": "Too many requests"}, {"Retry-After": str(self.state.retry_after)})
+            return
+        if self.state.failed():
+            self.respond(503, {"message": "Service unavailable"})
+            return
+        self.respond(200, handler())
+
+    def do_POST(self):
+        body = serialization.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        self.handle_request(lambda: self.state.rpc(body))
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        if url.path == "/__stats":
+            with self.state.lock:
+                stats = {**self.state.stats, "methods": dict(self.state.stats["methods"])}
+            self.respond(200, stats)
+        elif url.path.rstrip("/") == "/defi/history_price":
+            self.handle_request(lambda: self.state.price_history(query))
+        elif url.path.rstrip("/") == "/defi/multi_price":
+            self.handle_request(lambda: self.state.multi_price(query))
+        elif url.path.startswith("/latest/dex/tokens/"):
+            self.handle_request(lambda: self.state.dex_tokens(url.path[len("/latest/dex/tokens/"):]))
+        elif url.path.rstrip("/") == "/latest/dex/search":
+            self.handle_request(lambda: self.state.search(query))
+        else:
+            self.respond(404, {"message": "Not found"})
+
+
+def serve(port, state_args, ready=None):
+    wallets = [SyntheticWallet(name, size) for name, size in state_args.get("wallets", ())]
+    tokens = [SyntheticToken(name, holders, holder_size) for name, holders, holder_size in state_args.get("tokens", ())]
+    server = ThreadingHTTPServer(("127.0.0.1", port), MockHandler)
+    server.daemon_threads = True
+    server.state = MockState(wallets, tokens, state_args.get("latency", 0.0), state_args.get("throttle_rate", 0.0),
+                             state_args.get("retry_after", 1), state_args.get("error_rate", 0.0))
+    if ready is not None:
+        ready.send(server.server_port)
+        ready.close()
+    server.serve_forever()
+
+
+class MockServer:
+    # Runs in its own process so its memory and CPU don't count against the benchmarked run
+    def __init__(self, wallets=(), tokens=(), latency=0.0, throttle_rate=0.0, retry_after=1, error_rate=0.0):
+        self.state_args = {"wallets": list(wallets), "tokens": list(tokens), "latency": latency,
+                           "throttle_rate": throttle_rate, "retry_after": retry_after, "error_rate": error_rate}
+        self.process = None
+        self.url = None
+
+    def __enter__(self):
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        self.process = multiprocessing.Process(target=serve, args=(0, self.state_args, sender), daemon=True)
+        self.process.start()
+        self.url = f"http://127.0.0.1:{receiver.recv()}/"
+        return self
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        self.process.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Solana RPC, Birdeye and DexScreener APIs")
+    parser.add_argument("--port", type=int, default=8899)
+    parser.add_argument("--wallet-size", default="100",
+                        help="Transactions in the synthetic wallet (100, 10k, 100k or a number)")
+    parser.add_argument("--holders", type=int, default=5, help="Wallets holding the synthetic token")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 503")
+    args = parser.parse_args()
+
+    size = synthetic.SIZES.get(args.wallet_size) or int(args.wallet_size)
+    wallet = SyntheticWallet("mock", size)
+    token = SyntheticToken("mock", args.holders, size)
+    print(f"Serving on http://127.0.0.1:{args.port}/")
+    print(f"Wallet: {wallet.address} ({size} transactions)")
+    print(f"Token: {token.mint} ({args.holders} holders)")
+    print(f"Run walko with: --rpc-url http://127.0.0.1:{args.port}/ "
+          f"--set birdeye_url=http://127.0.0.1:{args.port} --set dexscreener_url=http://127.0.0.1:{args.port}")
+    serve(args.port, {"wallets": [("mock", size)], "tokens": [("mock", args.holders, size)],
+                      "latency": args.latency, "throttle_rate": args.throttle_rate, "error_rate": args.error_rate})
+
+
+if __name__ == "__main__":
+    main()
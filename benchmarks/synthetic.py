@@ -0,0 +1,104 @@
+import hashlib
+import json
+import math
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+import serialization  # noqa: E402
+from solana_keys import b58decode, b58encode, is_on_curve  # noqa: E402
+
+fixtures_path = os.path.join(os.path.dirname(__file__), 'fixtures', 'transactions.json')
+
+SIZES = {"100": 100, "10k": 10_000, "100k": 100_000}
+
+# The token bought and sold in the recorded swaps, replaced by a synthetic mint per trade group
+FIXTURE_TOKEN = "DezXAZ8z7PnrnRJjz3wXBoRgixCa6xjnB7YaB1pPB263"
+POOL_AUTHORITY = "5Q544fKrFoe6tsEbD7S8EmxGTJYAKtTVhAW5Q5pge4j1"
+
+START_TIME = 1_700_000_000
+START_SLOT = 250_000_000
+# About 144 transactions a day, well below the pre-filter's bot threshold
+INTERVAL = 600
+SIGNATURE_PREFIX_SIZE = 56
+
+
+def derive_address(seed, on_curve=True):
+    # Deterministic, so the mock server and the benchmark agree on addresses without sharing state
+    counter = 0
+    while True:
+        address = b58encode(hashlib.sha256(f"{seed}:{counter}".encode()).digest())
+        if is_on_curve(address) == on_curve:
+            return address
+        counter += 1
+
+
+def price(mint, timestamp):
+    base = 0.5 + int.from_bytes(hashlib.sha256(mint.encode()).digest()[:4], "big") % 1000 / 100
+    return base * (1 + 0.2 * math.sin(timestamp / 86400))
+
+
+def load_templates(wallet_address):
+    with open(fixtures_path) as f:
+        fixtures = json.load(f)
+    return [serialization.dumps(transaction).replace(fixtures["wallet"].encode(), wallet_address.encode())
+            for transaction in fixtures["transactions"]]
+
+
+class SyntheticWallet:
+    # Transactions are generated on demand from the recorded templates, index 0 is the oldest
+    def __init__(self, name, size, tokens=20, interval=INTERVAL):
+        self.name = name
+        self.size = size
+        self.interval = interval
+        self.address = derive_address(f"wallet:{name}")
+        self.token_mints = [derive_address(f"token:{name}:{index}") for index in range(tokens)]
+        self.signature_prefix = hashlib.sha512(self.address.encode()).digest()[:SIGNATURE_PREFIX_SIZE]
+        self.templates = load_templates(self.address)
+
+    def signature(self, index):
+        return b58encode(self.signature_prefix + index.to_bytes(8, "big"))
+
+    @staticmethod
+    def split_signature(signature):
+        raw = b58decode(signature)
+        return raw[:SIGNATURE_PREFIX_SIZE], int.from_bytes(raw[SIGNATURE_PREFIX_SIZE:], "big")
+
+    def block_time(self, index):
+        return START_TIME + index * self.interval
+
+    def signatures(self, before=None, until=None, limit=1000):
+        # Newest first, paged like getSignaturesForAddress
+        end = self.size if before is None else self.split_signature(before)[1]
+        stop = -1 if until is None else self.split_signature(until)[1]
+        return [{
+            "signature": self.signature(index),
+            "slot": START_SLOT + index,
+            "err": None,
+            "memo": None,
+            "blockTime": self.block_time(index),
+            "confirmationStatus": "finalized",
+        } for index in range(end - 1, max(stop, end - 1 - limit), -1)]
+
+    def transaction(self, index):
+        if not 0 <= index < self.size:
+            return None
+        # Each group of templates (a buy, a sell, ...) trades the same token
+        template = self.templates[index % len(self.templates)]
+        mint = self.token_mints[index // len(self.templates) % len(self.token_mints)]
+        transaction = serialization.loads(template.replace(FIXTURE_TOKEN.encode(), mint.encode()))
+        transaction["blockTime"] = self.block_time(index)
+        transaction["slot"] = START_SLOT + index
+        transaction["transaction"]["signatures"] = [self.signature(index)]
+        return transaction
+
+
+class SyntheticToken:
+    # A token whose largest holders are synthetic wallets, plus one liquidity pool the pre-filter should drop
+    def __init__(self, name, holders, holder_size):
+        self.name = name
+        self.mint = derive_address(f"mint:{name}")
+        self.wallets = [SyntheticWallet(f"{name}:holder:{index}", holder_size) for index in range(holders)]
+        owners = [wallet.address for wallet in self.wallets] + [POOL_AUTHORITY]
+        self.token_accounts = {derive_address(f"account:{name}:{owner}"): owner for owner in owners}